@@ -0,0 +1,49 @@
+# encoding=utf8
+"""
+Measure "jjwrecker -b" on a batch of copies of the test fixtures, with an
+increasing number of worker processes.
+
+Usage: python benchmarks/bench_batch.py [copies]
+"""
+from __future__ import print_function
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from jenkins_job_wrecker.batch import batch_files, convert_files
+
+fixtures_path = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                             'fixtures')
+
+FIXTURES = ['calamari-clients', 'ice-setup', 'non-ascii']
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    batch_dir = tempfile.mkdtemp()
+    try:
+        for name in FIXTURES:
+            src = os.path.join(fixtures_path, name + '.xml')
+            for i in range(copies):
+                shutil.copy(src, os.path.join(batch_dir,
+                                              '%s-%d.xml' % (name, i)))
+        items = batch_files(batch_dir)
+        processes = 1
+        while processes <= multiprocessing.cpu_count():
+            start = time.time()
+            for _ in convert_files(items, processes=processes):
+                pass
+            elapsed = time.time() - start
+            print('%3d processes: %7.0f jobs/s' % (processes,
+                                                   len(items) / elapsed))
+            processes *= 2
+    finally:
+        shutil.rmtree(batch_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# encoding=utf8
+"""
+Compare the pure-Python YAML emitter with libyaml's on the converted test
+fixtures.
+
+Usage: python benchmarks/bench_emitter.py [runs]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import yaml
+
+from jenkins_job_wrecker.cli import Dumper, dump_yaml, get_xml_root, \
+    root_to_yaml, setup_str_presenter
+
+fixtures_path = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                             'fixtures')
+
+FIXTURES = ['calamari-clients', 'ice-setup', 'indentation_without_tab']
+
+
+def measure(dump, builds, runs):
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        for build in builds:
+            dump(build)
+        times.append(time.time() - start)
+    return min(times) / len(builds)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    context = setup_str_presenter()
+    builds = []
+    for name in FIXTURES:
+        root = get_xml_root(filename=os.path.join(fixtures_path,
+                                                  name + '.xml'))
+        builds.append(yaml.safe_load(root_to_yaml(root, name)))
+
+    def pure_python(build):
+        return yaml.dump(build, Dumper=context.python_dumper,
+                         default_flow_style=False, default_style=None)
+
+    print('emitter: %s' % Dumper.__name__)
+    python = measure(pure_python, builds, runs)
+    print('pure Python: %6.2f ms/job' % (python * 1000))
+    libyaml = measure(dump_yaml, builds, runs)
+    print('dump_yaml:   %6.2f ms/job (%.1fx)' % (libyaml * 1000,
+                                                 python / libyaml))
+
+
+if __name__ == '__main__':
+    main()
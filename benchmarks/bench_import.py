@@ -0,0 +1,62 @@
+# encoding=utf8
+"""
+Measure import time, memory and loaded handler modules for single-job
+conversions, one fresh interpreter per job.
+
+Usage: python benchmarks/bench_import.py
+"""
+from __future__ import print_function
+
+import json
+import os
+import subprocess
+import sys
+
+fixtures_path = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                             'fixtures')
+
+JOBS = {
+    'listview': '<hudson.model.ListView><name>v</name>'
+                '<filterExecutors>false</filterExecutors>'
+                '</hudson.model.ListView>',
+    'freestyle': '<project><description>d</description>'
+                 '<disabled>false</disabled><builders/></project>',
+    'ice-setup': os.path.join(fixtures_path, 'ice-setup.xml'),
+}
+
+SCRIPT = '''
+import json, sys, time, tracemalloc
+tracemalloc.start()
+start = time.time()
+from jenkins_job_wrecker.cli import get_xml_root, root_to_yaml
+imported = time.time()
+source = sys.argv[1]
+if source.startswith('<'):
+    root = get_xml_root(string=source)
+else:
+    root = get_xml_root(filename=source)
+root_to_yaml(root, 'job')
+done = time.time()
+print(json.dumps({
+    'import': imported - start,
+    'total': done - start,
+    'peak': tracemalloc.get_traced_memory()[1],
+    'modules': len([m for m in sys.modules
+                    if m.startswith('jenkins_job_wrecker.modules.')]),
+}))
+'''
+
+
+def main():
+    print('%-10s %10s %10s %12s %8s' % ('job', 'import ms', 'total ms',
+                                         'peak KiB', 'modules'))
+    for name, source in sorted(JOBS.items()):
+        out = subprocess.check_output([sys.executable, '-c', SCRIPT, source])
+        result = json.loads(out.decode('utf-8'))
+        print('%-10s %10.1f %10.1f %12.1f %8d' % (
+            name, result['import'] * 1000, result['total'] * 1000,
+            result['peak'] / 1024.0, result['modules']))
+
+
+if __name__ == '__main__':
+    main()
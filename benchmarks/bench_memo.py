@@ -0,0 +1,70 @@
+# encoding=utf8
+"""
+Measure a batch of copies of the test fixtures, and of a job full of plugin
+settings that jjwrecker keeps as raw XML, on one process, without and with
+the memo of identical top-level elements (--memo-size).
+
+Usage: python benchmarks/bench_memo.py [copies]
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from jenkins_job_wrecker.batch import batch_files, convert_files
+from jenkins_job_wrecker.cli import get_context
+from jenkins_job_wrecker.memo import DEFAULT_SIZE
+
+fixtures_path = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                             'fixtures')
+
+FIXTURES = ['calamari-clients', 'ice-setup', 'non-ascii']
+
+PLUGIN = '''
+    <org.example.plugins.SomeNotifier plugin="some@1.2">
+      <recipients>dev@example.com ops@example.com</recipients>
+      <options>
+        <sendToIndividuals>true</sendToIndividuals>
+        <rules><rule name="a">x</rule><rule name="b">y</rule></rules>
+      </options>
+    </org.example.plugins.SomeNotifier>'''
+
+RAW_JOB = '''<project>
+  <description>raw</description>
+  <publishers>%s
+  </publishers>
+</project>''' % (PLUGIN * 6)
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    batch_dir = tempfile.mkdtemp()
+    try:
+        for name in FIXTURES:
+            src = os.path.join(fixtures_path, name + '.xml')
+            for i in range(copies):
+                shutil.copy(src, os.path.join(batch_dir,
+                                              '%s-%d.xml' % (name, i)))
+        for i in range(copies):
+            with open(os.path.join(batch_dir, 'raw-%d.xml' % i), 'w') as f:
+                f.write(RAW_JOB)
+        items = batch_files(batch_dir)
+        for memo_size in (0, DEFAULT_SIZE):
+            start = time.time()
+            for _ in convert_files(items, processes=1, memo_size=memo_size):
+                pass
+            elapsed = time.time() - start
+            print('memo size %5d: %7.0f jobs/s' % (memo_size,
+                                                   len(items) / elapsed))
+            memo = get_context().memo
+            if memo is not None:
+                print('  %s' % memo.summary())
+    finally:
+        shutil.rmtree(batch_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# encoding=utf8
+"""
+Compare the XML parser backends on pipeline jobs with a giant inline Groovy
+script: parse time, and the peak memory of a fresh process that parses the
+job once.
+
+Usage: python benchmarks/bench_parser.py [megabytes ...]
+"""
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from jenkins_job_wrecker import xmlparser
+
+PIPELINE = '''<?xml version='1.1' encoding='UTF-8'?>
+<flow-definition plugin="workflow-job@2.40">
+  <description>Giant pipeline</description>
+  <definition class="org.jenkinsci.plugins.workflow.cps.CpsFlowDefinition">
+    <script>%s</script>
+    <sandbox>true</sandbox>
+  </definition>
+</flow-definition>
+'''
+
+STAGE = '''stage(&apos;Build %d&apos;) {
+  steps {
+    sh &quot;make -j8 TARGET=%d &amp;&amp; echo &lt;done&gt;&quot;
+  }
+}
+'''
+
+# Linux only: ru_maxrss would include the memory of the parent process.
+MEMORY = '''
+import sys
+from jenkins_job_wrecker import xmlparser
+
+
+def peak():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+
+
+xmlparser.set_backend(sys.argv[1])
+before = peak()
+root = xmlparser.parse(filename=sys.argv[2])
+print(peak() - before)
+'''
+
+
+def pipeline(megabytes):
+    stages = []
+    size = 0
+    while size < megabytes * 1024 * 1024:
+        stage = STAGE % (len(stages), len(stages))
+        stages.append(stage)
+        size += len(stage)
+    return PIPELINE % ''.join(stages)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1, 8, 32]
+    backends = [backend for backend in xmlparser.BACKENDS
+                if backend != 'lxml' or xmlparser.etree is not None]
+    for megabytes in sizes:
+        fd, filename = tempfile.mkstemp(suffix='.xml')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(pipeline(megabytes))
+            for backend in backends:
+                xmlparser.set_backend(backend)
+                times = []
+                for _ in range(5):
+                    start = time.time()
+                    xmlparser.parse(filename=filename)
+                    times.append(time.time() - start)
+                rss = int(subprocess.check_output(
+                    [sys.executable, '-c', MEMORY, backend, filename]))
+                print('%4d MB %-6s parse: %8.1f ms  peak memory: +%d KiB'
+                      % (megabytes, backend, min(times) * 1000, rss))
+        finally:
+            os.unlink(filename)
+
+
+if __name__ == '__main__':
+    main()
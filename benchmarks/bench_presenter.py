@@ -0,0 +1,38 @@
+# encoding=utf8
+"""
+Stress the YAML string presenter with --replace-tabs on pathological
+scripts: one very long line full of tabs, and tens of thousands of short
+lines. The time per character should stay flat as the inputs grow.
+
+Usage: python benchmarks/bench_presenter.py
+"""
+from __future__ import print_function
+
+import time
+
+from jenkins_job_wrecker.cli import dump_yaml, setup_str_presenter
+
+
+def long_line(size):
+    return 'echo\t' * (size // 5) + '\nexit 0'
+
+
+def many_lines(size):
+    return 'if true; then\n\techo "\tline"\t\nfi\n' * (size // 33)
+
+
+def main():
+    setup_str_presenter(True)
+    for name, script in (('long line', long_line),
+                         ('many lines', many_lines)):
+        for size in (100000, 1000000, 4000000):
+            build = [{'job': {'builders': [{'shell': script(size)}]}}]
+            start = time.time()
+            dump_yaml(build)
+            elapsed = time.time() - start
+            print('%-10s %8d chars: %7.1f ms (%.0f ns/char)'
+                  % (name, size, elapsed * 1000, elapsed * 1e9 / size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# encoding=utf8
+"""
+Measure the per-job cost of registry setup compared to the conversion itself.
+
+Usage: python benchmarks/bench_registry.py [iterations]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+from jenkins_job_wrecker.cli import get_xml_root, root_to_yaml
+from jenkins_job_wrecker.modules.handlers import Handlers
+from jenkins_job_wrecker.registry import get_registry
+
+fixtures_path = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                             'fixtures')
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    root = get_xml_root(filename=os.path.join(fixtures_path, 'ice-setup.xml'))
+
+    # The first call pays for building the registry once per process.
+    first = timeit.timeit(lambda: get_registry().get_handler(Handlers),
+                          number=1)
+    setup = timeit.timeit(lambda: get_registry().get_handler(Handlers),
+                          number=iterations)
+    convert = timeit.timeit(lambda: root_to_yaml(root, 'ice-setup'),
+                            number=iterations)
+
+    print('registry build (once):  %8.3f ms' % (first * 1000))
+    print('registry setup per job: %8.3f us' % (setup / iterations * 1e6))
+    print('conversion per job:     %8.3f us' % (convert / iterations * 1e6))
+
+
+if __name__ == '__main__':
+    main()
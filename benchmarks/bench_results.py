@@ -0,0 +1,53 @@
+# encoding=utf8
+"""
+Measure a batch of copies of the test fixtures on one process, without the
+result cache of --cache-dir, then with it empty and filled.
+
+Usage: python benchmarks/bench_results.py [copies]
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from jenkins_job_wrecker.batch import batch_files, convert_files
+from jenkins_job_wrecker.cache import ResultCache
+
+fixtures_path = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                             'fixtures')
+
+FIXTURES = ['calamari-clients', 'ice-setup', 'non-ascii']
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    batch_dir = tempfile.mkdtemp()
+    cache_dir = tempfile.mkdtemp()
+    try:
+        for name in FIXTURES:
+            src = os.path.join(fixtures_path, name + '.xml')
+            for i in range(copies):
+                shutil.copy(src, os.path.join(batch_dir,
+                                              '%s-%d.xml' % (name, i)))
+        items = batch_files(batch_dir)
+        cache = ResultCache(cache_dir)
+        for label, result_cache in (('no cache', None), ('empty', cache),
+                                    ('filled', cache)):
+            start = time.time()
+            for _ in convert_files(items, processes=1,
+                                   result_cache=result_cache):
+                pass
+            elapsed = time.time() - start
+            print('%-8s: %7.0f jobs/s' % (label, len(items) / elapsed))
+        print('cache: %d KiB for %d jobs' % (cache.disk_usage() // 1024,
+                                            len(items)))
+    finally:
+        shutil.rmtree(batch_dir)
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# encoding=utf8
+"""
+Measure the cold start of "jjwrecker -f" on a single job, one fresh
+interpreter per run.
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+fixtures_path = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                             'fixtures')
+
+SCRIPT = 'import sys; from jenkins_job_wrecker.cli import main; main()'
+
+
+def run(args):
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable, '-c', SCRIPT] + args,
+                              stdout=devnull, stderr=devnull)
+    return time.time() - start
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    output_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(fixtures_path, 'ice-setup.xml')
+        args = ['-f', filename, '-n', 'ice-setup', '-o', output_dir]
+        import_times = sorted(run(['--help']) for _ in range(runs))
+        convert_times = sorted(run(args) for _ in range(runs))
+    finally:
+        shutil.rmtree(output_dir)
+    print('jjwrecker --help (median): %8.1f ms'
+          % (import_times[runs // 2] * 1000))
+    print('jjwrecker -f (median):     %8.1f ms'
+          % (convert_times[runs // 2] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# encoding=utf8
+"""
+Compare converting a very large job from its whole parsed tree with
+converting it while it is parsed (StreamConverter): time, and the peak
+memory of a fresh process converting it once (Linux only).
+
+Usage: python benchmarks/bench_stream.py [builders]
+"""
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from jenkins_job_wrecker.cli import get_xml_root, iter_file, root_to_yaml, \
+    stream_to_yaml
+
+JOB = '''<?xml version='1.1' encoding='UTF-8'?>
+<project>
+  <description>Huge job</description>
+  <builders>
+%s
+  </builders>
+  <publishers/>
+  <buildWrappers/>
+</project>
+'''
+
+SHELL = '''    <hudson.tasks.Shell>
+      <command>%s</command>
+    </hudson.tasks.Shell>'''
+
+SCRIPT = 'echo &quot;step %d&quot; &amp;&amp; make -j8 all\n' * 200
+
+CONVERT = '''
+import sys
+from jenkins_job_wrecker.cli import get_xml_root, iter_file, root_to_yaml, \\
+    stream_to_yaml
+
+
+def peak():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+
+
+before = peak()
+if sys.argv[1] == 'tree':
+    root_to_yaml(get_xml_root(filename=sys.argv[2]), 'job')
+else:
+    stream_to_yaml(iter_file(sys.argv[2]), 'job')
+print(peak() - before)
+'''
+
+
+def main():
+    builders = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    fd, filename = tempfile.mkstemp(suffix='.xml')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(JOB % '\n'.join(SHELL % SCRIPT for _ in range(builders)))
+        size = os.path.getsize(filename) // (1024 * 1024)
+        for mode in ('tree', 'stream'):
+            start = time.time()
+            if mode == 'tree':
+                root_to_yaml(get_xml_root(filename=filename), 'job')
+            else:
+                stream_to_yaml(iter_file(filename), 'job')
+            elapsed = time.time() - start
+            rss = int(subprocess.check_output(
+                [sys.executable, '-c', CONVERT, mode, filename]))
+            print('%d MB %-6s convert: %6.0f ms  peak memory: +%d KiB'
+                  % (size, mode, elapsed * 1000, rss))
+    finally:
+        os.unlink(filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# encoding=utf8
+"""
+Measure the grouping of near-duplicate jobs into job templates: copies of
+the test fixtures that differ in their descriptions and a few other values,
+and the size of their YAML with and without templates.
+
+Usage: python benchmarks/bench_templates.py [copies]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import yaml
+
+from jenkins_job_wrecker.cli import dump_yaml, get_xml_root, root_to_yaml
+from jenkins_job_wrecker.memo import copy_data
+from jenkins_job_wrecker.templates import TemplateIndex
+
+fixtures_path = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                             'fixtures')
+
+FIXTURES = ['calamari-clients', 'ice-setup', 'non-ascii']
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    jobs = []
+    for name in FIXTURES:
+        root = get_xml_root(filename=os.path.join(fixtures_path,
+                                                  name + '.xml'))
+        job = yaml.safe_load(root_to_yaml(root, name))[0]['job']
+        for i in range(copies):
+            copy = copy_data(job)
+            copy['name'] = '%s-%d' % (name, i)
+            copy['description'] = 'copy %d of %s' % (i, name)
+            copy['concurrent'] = i % 3 == 0
+            if i % 10 == 0:
+                copy['node'] = 'label-%d' % (i // 10)
+            jobs.append(copy)
+    size = sum(len(dump_yaml([{'job': job}])) for job in jobs)
+
+    start = time.time()
+    index = TemplateIndex(2)
+    for job in jobs:
+        index.add(job['name'], job)
+    templates = index.templates()
+    elapsed = time.time() - start
+    templated = sum(len(template.names) for template in templates)
+    template_size = sum(len(dump_yaml(template.definitions()))
+                        for template in templates)
+    print('%d jobs in %d templates, grouped in %.2fs (%.0f jobs/s)'
+          % (templated, len(templates), elapsed, len(jobs) / elapsed))
+    print('YAML: %d KiB of templates instead of %d KiB of jobs'
+          % (template_size // 1024, size // 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# encoding=utf8
+"""
+asyncio API to convert the jobs and views of a Jenkins server, for services
+that embed jjwrecker. It needs Python 3 and aiohttp::
+
+    pip install jenkins-job-wrecker[async]
+
+Example::
+
+    async for element_type, fullname, yaml in convert_server(url):
+        ...
+"""
+import asyncio
+import json
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from jenkins_job_wrecker.cli import CHUNK_SIZE, ConversionContext, \
+    StreamConverter
+from jenkins_job_wrecker.registry import Registry
+from jenkins_job_wrecker.server import inventory_tree, job_url, \
+    parse_inventory, view_url
+
+
+class AsyncJenkins(object):
+    """
+    Minimal Jenkins client sharing one pool of keep-alive connections.
+    """
+
+    def __init__(self, url, username=None, password=None, concurrency=100,
+                 session=None):
+        if aiohttp is None:
+            raise ImportError('aiohttp is required for the asyncio API')
+        self.url = url.rstrip('/') + '/'
+        self.auth = None
+        if username is not None:
+            self.auth = aiohttp.BasicAuth(username, password or '')
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = session
+        self.own_session = session is None
+        self.concurrency = concurrency
+
+    async def __aenter__(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                auto_decompress=True,
+                headers={'Accept-Encoding': 'gzip'})
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.own_session:
+            await self.session.close()
+
+    async def get(self, path, params=None):
+        """ Return the body of a GET request, relative to the server URL. """
+        async with self.semaphore:
+            async with self.session.get(self.url + path, params=params,
+                                        auth=self.auth) as response:
+                response.raise_for_status()
+                return await response.text()
+
+    async def iter_chunks(self, path, size=CHUNK_SIZE):
+        """
+        Yield the body of a GET request in chunks, as they are downloaded.
+        """
+        async with self.semaphore:
+            async with self.session.get(self.url + path,
+                                        auth=self.auth) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(size):
+                    yield chunk
+
+    async def get_json(self, path, tree):
+        """ Return the JSON API data of "path" for a "tree" query. """
+        data = await self.get(path + 'api/json', params={'tree': tree})
+        return json.loads(data)
+
+    async def get_inventory(self):
+        """
+        List every job, folder and view, like server.get_inventory(). Deep
+        folders are listed concurrently.
+        """
+        tree = inventory_tree()
+        data = await self.get_json('', 'views[name],' + tree)
+        views = [{'name': view['name']} for view in data.get('views', [])]
+        jobs, folders = parse_inventory(data)
+        while folders:
+            results = await asyncio.gather(*[
+                self.get_json(job_url(folder), tree) for folder in folders])
+            folders = []
+            for data in results:
+                more_jobs, more_folders = parse_inventory(data)
+                jobs.extend(more_jobs)
+                folders.extend(more_folders)
+        return jobs, views
+
+
+async def convert_server(url, username=None, password=None,
+                         ignore_actions=False, replace_tabs=False,
+                         concurrency=100, executor=None, session=None):
+    """
+    Convert every job and view on the Jenkins server at "url".
+
+    Configs are downloaded with up to "concurrency" requests in flight, and
+    each one is parsed and converted in "executor" (the loop's default
+    executor if None) chunk by chunk, while it is downloaded.
+
+    This is an async generator of (element_type, fullname, yaml) tuples,
+    in the order the conversions finish.
+    """
+    loop = asyncio.get_running_loop()
+    # The threads of the executor convert at the same time, with their own
+    # frozen registry.
+    registry = Registry()
+    await loop.run_in_executor(executor, registry.freeze)
+    context = ConversionContext(replace_tabs, registry=registry)
+    async with AsyncJenkins(url, username, password, concurrency,
+                            session) as server:
+
+        async def convert(element_type, fullname, path):
+            # Chunks are fed from any thread of the executor, which lxml
+            # does not support.
+            converter = StreamConverter(fullname, ignore_actions, 'etree',
+                                        context)
+            async for chunk in server.iter_chunks(path + 'config.xml'):
+                await loop.run_in_executor(executor, converter.feed, chunk)
+            yaml = await loop.run_in_executor(executor, converter.close)
+            return element_type, fullname, yaml
+
+        jobs, views = await server.get_inventory()
+        job_names = [job['fullname'] for job in jobs]
+        view_names = [view['name'] for view in views if view['name'] != 'all']
+        tasks = [asyncio.ensure_future(convert('job', name, job_url(name)))
+                 for name in job_names]
+        tasks.extend(asyncio.ensure_future(convert('view', name,
+                                                   view_url(name)))
+                     for name in view_names)
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
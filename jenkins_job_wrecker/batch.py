@@ -0,0 +1,194 @@
+# encoding=utf8
+"""
+Convert many XML files at once, on a pool of worker processes.
+"""
+import copy
+from functools import partial
+import glob
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import traceback
+
+from jenkins_job_wrecker.cli import cached_stream_to_yaml, file_digest, \
+    get_context, iter_file, setup_str_presenter
+from jenkins_job_wrecker.registry import get_registry
+from jenkins_job_wrecker import xmlparser
+
+
+def file_name(filename):
+    """
+    Return the job name for an XML file: its base name without the
+    extension, or the name of its folder for a Jenkins "config.xml".
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+    if name == 'config':
+        name = os.path.basename(os.path.dirname(os.path.abspath(filename)))
+    return name
+
+
+def batch_files(spec):
+    """
+    Return (name, filename) for each XML file of a batch. "spec" is either
+
+    * a directory: every .xml file under it, named after its path in the
+      directory without the extension, like "folder/job", or the path of
+      its folder for a "config.xml",
+    * a glob, like "jobs/*/config.xml",
+    * or a text file listing one XML file per line.
+
+    Files from a glob or a list are named with file_name(). Raises
+    ValueError if two files get the same name.
+    """
+    items = []
+    if os.path.isdir(spec):
+        for dirpath, dirnames, filenames in os.walk(spec):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith('.xml'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                if filename == 'config.xml':
+                    name = os.path.relpath(dirpath, spec)
+                    if name == os.curdir:
+                        name = file_name(path)
+                else:
+                    name = os.path.relpath(path, spec)[:-len('.xml')]
+                items.append((name.replace(os.sep, '/'), path))
+    else:
+        if any(c in spec for c in '*?['):
+            filenames = sorted(glob.glob(spec))
+        else:
+            with open(spec) as f:
+                filenames = [line.strip() for line in f
+                             if line.strip() and not line.startswith('#')]
+        items = [(file_name(filename), filename) for filename in filenames]
+
+    seen = {}
+    for name, filename in items:
+        if name in seen:
+            raise ValueError('%s and %s would both be converted to "%s"'
+                             % (seen[name], filename, name))
+        seen[name] = filename
+    return items
+
+
+def init_worker(replace_tabs=False, plugin_cache=None, parser=None,
+                recover=False, memo_size=0, result_cache=None):
+    """
+    Set up a worker process: the YAML presenter, the XML parser and a fully
+    loaded, frozen registry, so its first conversion is as fast as the
+    others. Returns the default conversion context it set up.
+    """
+    context = setup_str_presenter(replace_tabs, memo_size, result_cache)
+    if parser:
+        xmlparser.set_backend(parser, recover=recover)
+    reg = get_registry()
+    if plugin_cache:
+        reg.load_snapshot(plugin_cache)
+    reg.freeze()
+    return context
+
+
+def init_pool_worker(replace_tabs, plugin_cache, parser, recover, memo_size,
+                     result_cache):
+    """
+    init_worker() in a pool process, with its own copy of the result cache:
+    its statistics only count the files of this process.
+    """
+    if result_cache is not None:
+        result_cache = copy.copy(result_cache)
+    init_worker(replace_tabs, plugin_cache, parser, recover, memo_size,
+                result_cache)
+
+
+def convert_file(item, ignore_actions=False, context=None):
+    """
+    Convert one (name, filename) item of a batch. Returns (yaml, error),
+    where error is None, or the traceback of the failed conversion.
+    """
+    name, filename = item
+    try:
+        return cached_stream_to_yaml(partial(file_digest, filename),
+                                     iter_file(filename), name,
+                                     ignore_actions, context=context), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def convert_in_worker(item, ignore_actions=False):
+    """
+    convert_file() in a worker process. Also returns the process ID and
+    the statistics of its memo and result cache so far.
+    """
+    result = convert_file(item, ignore_actions)
+    context = get_context()
+    stats = {}
+    if context.memo is not None:
+        stats['memo'] = dict(context.memo.stats)
+    if context.result_cache is not None:
+        stats['result_cache'] = dict(context.result_cache.stats)
+    return result + (os.getpid(), stats)
+
+
+def convert_files(items, ignore_actions=False, processes=None,
+                  replace_tabs=False, plugin_cache=None, parser=None,
+                  recover=False, threads=False, memo_size=0,
+                  result_cache=None):
+    """
+    Convert (name, filename) items on a pool of worker processes, and yield
+    (name, filename, yaml, error) in the order of "items". A failure only
+    affects its own file, see convert_file().
+
+    :param processes: Number of worker processes, one per CPU by default.
+    :param parser: XML parser backend of the workers, see xmlparser.
+    :param threads: Convert on a pool of threads instead of processes.
+                    They share one conversion context and a frozen
+                    registry. Only faster on free-threaded Python.
+    :param memo_size: Size of the SubtreeMemo of each worker process, or
+                      of the one the threads share. The statistics of the
+                      workers add up in the memo of this process.
+    :param result_cache: A cache.ResultCache to reuse the YAML of files
+                         that were converted before. Its statistics add
+                         up like the memo's.
+    """
+    items = list(items)
+    if not processes:
+        processes = multiprocessing.cpu_count()
+    # Forked workers inherit everything this process already loaded.
+    context = init_worker(replace_tabs, plugin_cache, parser, recover,
+                          memo_size, result_cache)
+    if processes == 1 or len(items) < 2:
+        for item in items:
+            yield item + convert_file(item, ignore_actions, context)
+        return
+
+    # Hand out several files per task to keep the IPC overhead low, but
+    # enough tasks to balance jobs of very different sizes.
+    chunksize = max(1, min(64, len(items) // (processes * 4)))
+    if threads:
+        convert = partial(convert_file, ignore_actions=ignore_actions,
+                          context=context)
+        pool = ThreadPool(processes)
+    else:
+        # Worker processes set up their own default context.
+        convert = partial(convert_in_worker, ignore_actions=ignore_actions)
+        pool = multiprocessing.Pool(processes, init_pool_worker,
+                                    (replace_tabs, plugin_cache, parser,
+                                     recover, memo_size, result_cache))
+    # Latest statistics of each worker process
+    worker_stats = {}
+    try:
+        results = pool.imap(convert, items, chunksize)
+        for item, result in zip(items, results):
+            if not threads:
+                pid, stats = result[2:]
+                result = result[:2]
+                worker_stats[pid] = stats
+            yield item + result
+    finally:
+        pool.terminate()
+        pool.join()
+        for stats in worker_stats.values():
+            for name, value in stats.items():
+                getattr(context, name).add_stats(value)
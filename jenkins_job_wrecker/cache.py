@@ -0,0 +1,227 @@
+# encoding=utf8
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+from jenkins_job_wrecker.registry import converter_key
+
+# Default size limit of each cache, in bytes.
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+# Age in seconds after which prune() removes the temporary file of an entry,
+# left behind by a writer that crashed.
+STALE_TEMP_AGE = 3600
+
+
+class DiskCache(object):
+    """
+    A directory of cached entries, keyed by strings.
+
+    Once the entries grow past "max_size" bytes, the least recently used
+    ones are removed. Entries are written to a temporary file and renamed
+    into place, so concurrent threads and processes never read a partial
+    entry.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        # Bytes written since the last prune, and the size it left.
+        self.size = None
+        self.lock = threading.Lock()
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                # Another process created it first.
+                if not os.path.isdir(path):
+                    raise
+
+    def __getstate__(self):
+        # For worker processes: each one keeps its own lock and size.
+        state = self.__dict__.copy()
+        del state['lock']
+        state['size'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def filename(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    def get(self, key):
+        """ Return the bytes cached for "key", or None. """
+        filename = self.filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            # The modification time records when an entry was last used.
+            os.utime(filename, None)
+        except (IOError, OSError):
+            return None
+        return data
+
+    def set(self, key, data):
+        """ Cache the bytes "data" for "key". """
+        filename = self.filename(key)
+        dirname = os.path.dirname(filename)
+        if not os.path.isdir(dirname):
+            try:
+                os.mkdir(dirname)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+        fd, temp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            replaced = os.stat(filename).st_size
+        except OSError:
+            replaced = 0
+        os.rename(temp, filename)
+        with self.lock:
+            if self.size is None:
+                self.size = self.disk_usage()
+            else:
+                self.size += len(data) - replaced
+            if self.size > self.max_size:
+                self.prune()
+
+    def entries(self, temporary=False):
+        """
+        Yield (mtime, size, filename) of every entry, or of every temporary
+        file of an entry being written.
+        """
+        for prefix in os.listdir(self.path):
+            dirname = os.path.join(self.path, prefix)
+            if not os.path.isdir(dirname):
+                continue
+            for name in os.listdir(dirname):
+                if name.endswith('.tmp') != temporary:
+                    continue
+                filename = os.path.join(dirname, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, filename
+
+    def disk_usage(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def prune(self):
+        """
+        Remove the least recently used entries until the cache uses at
+        most 90% of max_size, so that pruning does not run on every write.
+        Temporary files older than STALE_TEMP_AGE are removed too.
+        """
+        stale = time.time() - STALE_TEMP_AGE
+        for mtime, _, filename in self.entries(temporary=True):
+            if mtime < stale:
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+        entries = sorted(self.entries())
+        size = sum(size for _, size, _ in entries)
+        target = self.max_size * 0.9
+        for _, entry_size, filename in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                # Another process pruned it already.
+                pass
+            size -= entry_size
+        self.size = size
+
+
+class ConfigCache(DiskCache):
+    """
+    Cache of the raw config.xml of jobs and views, keyed by URL, with the
+    ETag and Last-Modified validators the server sent with them.
+    """
+
+    def get_config(self, url):
+        """
+        Return (validators, xml) cached for "url", or (None, None).
+        "validators" is a dict of the HTTP response headers to revalidate
+        the entry with.
+        """
+        data = self.get(url)
+        if data is None:
+            return None, None
+        header, _, body = data.partition(b'\n')
+        return json.loads(header.decode('utf-8')), body.decode('utf-8')
+
+    def set_config(self, url, validators, xml):
+        header = json.dumps(validators).encode('utf-8')
+        self.set(url, header + b'\n' + xml.encode('utf-8'))
+
+
+class ResultCache(DiskCache):
+    """
+    Cache of converted YAML, keyed by the hash of the XML, the name of the
+    job or view, the conversion options and converter_key(), so that no
+    other version of jjwrecker or of its plugins ever uses an entry.
+    Entries are compressed with zlib.
+
+    "stats" counts the "hits" and "misses".
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, converter=None):
+        super(ResultCache, self).__init__(path, max_size)
+        if converter is None:
+            converter = converter_key()
+        self.converter = converter
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def __getstate__(self):
+        # Copies count their own statistics.
+        state = super(ResultCache, self).__getstate__()
+        state['stats'] = dict.fromkeys(self.stats, 0)
+        return state
+
+    def key(self, digest, name, options):
+        return '%s\n%s\n%r\n%s' % (self.converter, digest, options, name)
+
+    def get_yaml(self, digest, name, options):
+        """
+        Return the YAML cached for job or view "name" converted with
+        "options" from the XML hashing to "digest", or None.
+        """
+        data = self.get(self.key(digest, name, options))
+        yaml = None
+        if data is not None:
+            try:
+                yaml = zlib.decompress(data).decode('utf-8')
+            except (zlib.error, UnicodeDecodeError):
+                # A damaged entry is converted again.
+                pass
+        with self.lock:
+            self.stats['hits' if yaml is not None else 'misses'] += 1
+        return yaml
+
+    def set_yaml(self, digest, name, options, yaml):
+        self.set(self.key(digest, name, options),
+                 zlib.compress(yaml.encode('utf-8')))
+
+    def add_stats(self, stats):
+        """ Add the "stats" of another cache, like a worker process's. """
+        with self.lock:
+            for key, value in stats.items():
+                self.stats[key] += value
+
+    def summary(self):
+        """ Describe "stats" in one line. """
+        return ('%(hits)d of %(lookups)d results from the cache'
+                % dict(self.stats,
+                       lookups=self.stats['hits'] + self.stats['misses']))
@@ -2,14 +2,23 @@
 import argparse
 from argparse import ArgumentDefaultsHelpFormatter
 import errno
+import hashlib
+import io
 import logging
-import jenkins
 import os
+import re
 import sys
 import textwrap
 from jenkins_job_wrecker.modules.handlers import Handlers
-from jenkins_job_wrecker.modules.listview import Listview
-from jenkins_job_wrecker.registry import Registry
+from jenkins_job_wrecker.cache import ConfigCache, ResultCache
+from jenkins_job_wrecker.manifest import Manifest
+from jenkins_job_wrecker.memo import DEFAULT_SIZE as MEMO_SIZE, SubtreeMemo
+from jenkins_job_wrecker.registry import get_registry
+from jenkins_job_wrecker.server import ConfigFetcher, ordered_map
+from jenkins_job_wrecker.writers import OutputWriter, StreamWriter
+from jenkins_job_wrecker.sources import (archive_configs, jenkins_home_jobs,
+                                         jenkins_home_views)
+from jenkins_job_wrecker import xmlparser
 import xml.etree.ElementTree as ET
 import yaml
 from jenkins_job_wrecker.helpers import replace_tab
@@ -20,8 +29,21 @@ if PY2:
     sys.setdefaultencoding('utf8')
 
     text_type = unicode
+    string_types = (str, unicode)
 else:
     text_type = str
+    string_types = (str,)
+
+# libyaml's emitter, when PyYAML was built with it, is much faster than the
+# pure-Python one, and writes the same YAML except for a few corner cases,
+# see python_emitter().
+try:
+    from yaml import CDumper as Dumper
+except ImportError:
+    from yaml import Dumper
+# Characters that PyYAML escapes in double-quoted scalars
+SPECIAL_CHARACTERS = re.compile(u'[^\n\x20-\x7e]')
+SPECIAL_CHARACTERS_BUT_TAB = re.compile(u'[^\t\n\x20-\x7e]')
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger('jjwrecker')
@@ -29,17 +51,18 @@ log = logging.getLogger('jjwrecker')
 
 def get_str_presenter(should_replace_tabs=False):
     def str_presenter(dumper, data):
-        if len(data.splitlines()) > 1:
+        lines = data.splitlines()
+        if len(lines) > 1:
             # The dumper will not respect "style='|'" if it detects trailing
             # whitespace on any line within the data. For scripts the trailing
             # whitespace is not important.
-            lines = [l.rstrip() for l in data.splitlines()]
             if should_replace_tabs:
                 # Dumper also will not work on multiline if there are tab escape
                 # characters. If multiline is desired on text that has tab escape
                 # character, tabs should be replaced with spaces.
-                lines = [replace_tab(l) for l in lines]
-            data = '\n'.join(lines)
+                data = '\n'.join(replace_tab(l.rstrip()) for l in lines)
+            else:
+                data = '\n'.join(l.rstrip() for l in lines)
             return dumper.represent_scalar('tag:yaml.org,2002:str', data,
                                            style='|')
         return dumper.represent_scalar('tag:yaml.org,2002:str', data)
@@ -47,33 +70,98 @@ def get_str_presenter(should_replace_tabs=False):
     return str_presenter
 
 
-def setup_str_presenter(should_replace_tabs=False):
-    yaml.add_representer(str, get_str_presenter(should_replace_tabs))
-    if PY2:
-        yaml.add_representer(unicode, get_str_presenter(should_replace_tabs))
-
-
-# Given a file with XML, or a string of XML, parse it with
-# xml.etree.ElementTree and return the XML tree root.
+class ConversionContext(object):
+    """
+    The settings shared by conversions: the YAML dumper classes, with their
+    own string presenter, and the registry. A context is not modified once
+    created, so threads can share one, and conversions with different
+    settings can run side by side, each with its own context.
+
+    Threads should share a frozen registry, see Registry.freeze().
+
+    :param replace_tabs: Replace the tabs of multi-line strings, like -t.
+    :param literal_blocks: Write multi-line strings as literal blocks.
+    :param registry: The process-wide registry by default.
+    :param memo_size: Number of top-level elements to remember the
+                      conversions of, see SubtreeMemo. 0 disables it.
+    :param result_cache: A cache.ResultCache of the YAML of whole jobs and
+                         views, see cached_stream_to_yaml(), or None.
+    """
+
+    def __init__(self, replace_tabs=False, literal_blocks=True,
+                 registry=None, memo_size=0, result_cache=None):
+        self.replace_tabs = replace_tabs
+        self.literal_blocks = literal_blocks
+        self.registry = registry or get_registry()
+        # The memo and the cache themselves are safe to share between
+        # threads.
+        self.memo = SubtreeMemo(memo_size) if memo_size else None
+        self.result_cache = result_cache
+        # libyaml's dumper, and PyYAML's own for python_emitter()
+        self.dumper = self.make_dumper(Dumper)
+        self.python_dumper = self.make_dumper(yaml.Dumper)
+
+    def make_dumper(self, base):
+        # add_representer() copies the representers of "base" to the
+        # subclass first, so "base" itself is left alone.
+        dumper = type(base.__name__, (base,), {})
+        if self.literal_blocks:
+            str_presenter = get_str_presenter(self.replace_tabs)
+            dumper.add_representer(str, str_presenter)
+            if PY2:
+                dumper.add_representer(unicode, str_presenter)
+        return dumper
+
+
+# Used by the functions below when they are not given a context.
+_context = None
+
+
+def get_context():
+    """
+    Return the default ConversionContext, set by setup_str_presenter(). It
+    keeps PyYAML's plain strings until then.
+    """
+    global _context
+    if _context is None:
+        _context = ConversionContext(literal_blocks=False)
+    return _context
+
+
+def setup_str_presenter(should_replace_tabs=False, memo_size=0,
+                        result_cache=None):
+    """
+    Make the default context write multi-line strings as literal blocks,
+    and return it.
+    """
+    global _context
+    _context = ConversionContext(should_replace_tabs, memo_size=memo_size,
+                                 result_cache=result_cache)
+    return _context
+
+
+# Given a file with XML, or a string of XML, parse it with the XML parser
+# backend (lxml or xml.etree.ElementTree) and return the XML tree root.
 def get_xml_root(filename=False, string=False):
     if not filename and not string:
         raise TypeError('specify a filename or string argument')
     if filename:
-        tree = ET.parse(filename)
-        return tree.getroot()
+        return xmlparser.parse(filename=filename)
     if string:
-        return ET.fromstring(string)
+        return xmlparser.parse(string=string)
 
 
-# Walk an XML ElementTree ("root"), and return a YAML string
-def root_to_yaml(root, name, ignore_actions=False):
+# Walk an XML ElementTree ("root"), and return a YAML string, or write it to
+# "stream". "root" is left as it is.
+def root_to_yaml(root, name, ignore_actions=False, stream=None, context=None):
+    context = context or get_context()
     # Top-level "job" data
     job = {}
     job['name'] = text_type(name)
     build = []
 
-    # Create register
-    reg = Registry()
+    # The registry is built once per process and shared by every job
+    reg = context.registry
 
     # "project-type:" YAML
     project_types = reg.get_project_types()
@@ -81,38 +169,240 @@ def root_to_yaml(root, name, ignore_actions=False):
     if root.tag in project_types:
         job['project-type'] = project_types[root.tag]
 
-        if job['project-type'] == 'pipeline':
-            # For pipeline jobs, they have the
-            # DisableConcurrentBuildsJobProperty tag for not allowing
-            # concurrent builds, but no tag for true. JJB defaults to false,
-            # this is to make it true in the event that the tag doesn't exist
-            if not root.find('properties.DisableConcurrentBuildsJobProperty'):
-                conElement = ET.SubElement(root, 'concurrentBuild')
-                conElement.text = 'true'
-
         # Handle each top-level XML element with custom modules/functions in
         # modules/handlers.py
         # registry determines difference at runtime
         if job['project-type'] == 'listview':
             build.append({'view': job})
-            reg = Registry(ignore_actions=ignore_actions)
-            viewhandler = Listview(reg)
-            viewhandler.gen_yml(job, root)
+            # Imports modules/listview.py on first use
+            reg.lookup('handlers', 'listview')(root, job)
         elif job['project-type'] != 'folder':
             build.append({'job': job})
-            reg = Registry(ignore_actions=ignore_actions)
-            handlers = Handlers(reg)
-            handlers.gen_yml(job, root)
+            handlers = reg.get_handler(Handlers)
+            handlers.gen_yml(job, root, ignore_actions, context.memo)
+            if job['project-type'] == 'pipeline':
+                tag = 'properties.DisableConcurrentBuildsJobProperty'
+                disabled = root.find(tag)
+                if disabled is None or not len(disabled):
+                    gen_concurrent_build(handlers, job, ignore_actions)
     else:
         # Project type not currently supported, so output as raw XML
         if 'maven' in root.tag:
             job['project-type'] = 'maven'
 
         raw = {}
-        raw['xml'] = ET.tostring(root)
+        raw['xml'] = xmlparser.tostring(root)
         job['xml'] = {'raw': raw}
 
-    return yaml.dump(build, default_flow_style=False, default_style=None)
+    return dump_yaml(build, stream, context)
+
+
+def gen_concurrent_build(handlers, job, ignore_actions=False):
+    """
+    Pipeline jobs have the DisableConcurrentBuildsJobProperty tag for not
+    allowing concurrent builds, but no tag for allowing them. JJB defaults
+    to false, so convert a "concurrentBuild" of true for pipelines without
+    that tag.
+    """
+    element = ET.Element('concurrentBuild')
+    element.text = 'true'
+    handlers.gen_child(job, element, ignore_actions)
+
+
+def dump_yaml(build, stream=None, context=None):
+    """
+    Return the YAML of a list of jobs and views, or write it to "stream"
+    as it is emitted.
+    """
+    context = context or get_context()
+    if python_emitter(build, context):
+        dumper = context.python_dumper
+    else:
+        dumper = context.dumper
+    return yaml.dump(build, stream, Dumper=dumper, default_flow_style=False,
+                     default_style=None)
+
+
+def python_emitter(data, context=None):
+    """
+    Return True if libyaml could write "data" differently from PyYAML's own
+    emitter. That is if it has strings written as double-quoted scalars,
+    which the two fold differently, or as literal blocks that keep trailing
+    line breaks ("|+"), after which libyaml ends the document with "...".
+    """
+    context = context or get_context()
+    if isinstance(data, dict):
+        return any(python_emitter(key, context) or
+                   python_emitter(value, context)
+                   for key, value in data.items())
+    if isinstance(data, list):
+        return any(python_emitter(item, context) for item in data)
+    if not isinstance(data, text_type) and not (PY2 and isinstance(data, str)):
+        return False
+    # Written as a literal block by str_presenter(), unless it has special
+    # characters (other line breaks among them).
+    literal = (context.literal_blocks and
+               data.find('\n', 0, len(data) - 1) != -1)
+    if literal and context.replace_tabs:
+        special = SPECIAL_CHARACTERS_BUT_TAB
+    else:
+        special = SPECIAL_CHARACTERS
+    if special.search(data):
+        return True
+    if literal:
+        # "|+" if its last two lines are blank
+        body = data.rstrip()
+        trailing = data[len(body):]
+        lines = trailing.count('\n') + (not trailing.endswith('\n'))
+        return (lines - 1 if body else lines) >= 2
+    # Spaces around line breaks
+    return ' \n' in data or '\n ' in data
+
+
+# Size of the chunks fed to StreamConverter from bytes and files
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamConverter(object):
+    """
+    Converts a job to YAML while its XML is parsed: feed() it chunks of XML
+    as they are read or downloaded, then close() returns the YAML or writes
+    it to a stream, like root_to_yaml().
+
+    Each top-level element of a job is converted as soon as it is parsed
+    and then dropped, so the whole tree is never in memory. Views, folders
+    and unsupported project types are converted from the whole tree, once
+    it is parsed.
+
+    "backend" overrides the XML parser backend, see xmlparser.PullParser.
+    """
+
+    def __init__(self, name, ignore_actions=False, backend=None,
+                 context=None):
+        self.name = name
+        self.ignore_actions = ignore_actions
+        self.context = context or get_context()
+        self.parser = xmlparser.PullParser(backend)
+        self.depth = 0
+        self.root = None
+        # Set once the root element shows the job can be streamed.
+        self.job = None
+        self.handlers = None
+        self.concurrent_build = True
+
+    def feed(self, data):
+        self.parser.feed(data)
+        self.handle_events()
+
+    def close(self, stream=None):
+        root = self.parser.close()
+        self.handle_events()
+        if root is not None:
+            # Parsed as a whole, by a parser without events
+            self.root = root
+        if self.job is None:
+            return root_to_yaml(self.root, self.name, self.ignore_actions,
+                                stream, self.context)
+        # Same as root_to_yaml() for pipelines
+        if self.job['project-type'] == 'pipeline' and self.concurrent_build:
+            gen_concurrent_build(self.handlers, self.job, self.ignore_actions)
+        return dump_yaml([{'job': self.job}], stream, self.context)
+
+    def handle_events(self):
+        for event, element in self.parser.read_events():
+            if event == 'start':
+                if self.depth == 0:
+                    self.start(element)
+                self.depth += 1
+                continue
+            self.depth -= 1
+            if self.depth == 1 and self.job is not None:
+                self.convert_child(element)
+
+    def start(self, root):
+        self.root = root
+        reg = self.context.registry
+        project_type = reg.get_project_types().get(root.tag)
+        if project_type in (None, 'listview', 'folder'):
+            return
+        self.job = {'name': text_type(self.name),
+                    'project-type': project_type}
+        self.handlers = reg.get_handler(Handlers)
+
+    def convert_child(self, element):
+        # What root.find() in root_to_yaml() would find
+        tag = 'properties.DisableConcurrentBuildsJobProperty'
+        if element.tag == tag and len(element):
+            self.concurrent_build = False
+        self.handlers.gen_child(self.job, element, self.ignore_actions,
+                                self.context.memo)
+        self.root.remove(element)
+
+
+def stream_to_yaml(chunks, name, ignore_actions=False, stream=None,
+                   context=None):
+    """
+    Convert a job or view to YAML with a StreamConverter, from an iterable
+    of chunks of its XML. Returns the YAML, or writes it to "stream".
+    """
+    converter = StreamConverter(name, ignore_actions, context=context)
+    for chunk in chunks:
+        converter.feed(chunk)
+    return converter.close(stream)
+
+
+def cached_stream_to_yaml(digest, chunks, name, ignore_actions=False,
+                          stream=None, context=None):
+    """
+    Like stream_to_yaml(), but with the result cache of "context", if it
+    has one: a job or view is only converted, from "chunks", if the cache
+    does not have its YAML yet. "digest" is a function returning the hash
+    of the XML, like xml_digest() or file_digest(), and is only called with
+    a cache.
+    """
+    context = context or get_context()
+    cache = context.result_cache
+    if cache is None:
+        return stream_to_yaml(chunks, name, ignore_actions, stream, context)
+    key = digest()
+    options = (ignore_actions, context.replace_tabs, context.literal_blocks,
+               xmlparser.get_options()['recover'])
+    output = cache.get_yaml(key, name, options)
+    if output is None:
+        output = stream_to_yaml(chunks, name, ignore_actions,
+                                context=context)
+        cache.set_yaml(key, name, options, output)
+    if stream is None:
+        return output
+    stream.write(output)
+
+
+def xml_digest(data):
+    """ Return the hash of XML text or bytes, for the result cache. """
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(filename, size=CHUNK_SIZE):
+    """ Return the hash of an XML file, for the result cache. """
+    digest = hashlib.sha256()
+    for chunk in iter_file(filename, size):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_chunks(data, size=CHUNK_SIZE):
+    """ Split bytes of XML into chunks to feed a StreamConverter. """
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def iter_file(filename, size=CHUNK_SIZE):
+    """ Read an XML file in chunks to feed a StreamConverter. """
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(size), b''):
+            yield chunk
 
 
 # argparse foo
@@ -132,6 +422,32 @@ def parse_args(args):
         '-s', '--jenkins-server',
         help='Jenkins server to query'
     )
+    parser.add_argument(
+        '--jenkins-home',
+        help='JENKINS_HOME directory (or a copy of it) to read jobs and'
+             ' views from, instead of a Jenkins server'
+    )
+    parser.add_argument(
+        '--jenkins-archive',
+        help='tar or zip backup of a JENKINS_HOME to read jobs and views'
+             ' from, without extracting it. "-" reads a tar from stdin'
+    )
+    parser.add_argument(
+        '-b', '--batch',
+        help='directory, glob or list file of XML files to translate on a'
+             ' pool of processes. Each job is named after its file'
+    )
+    parser.add_argument(
+        '-p', '--processes',
+        type=int,
+        help='number of processes for --batch (default: one per CPU)'
+    )
+    parser.add_argument(
+        '--threads',
+        action='store_true', default=False,
+        help='with --batch, convert on threads instead of processes. Only'
+             ' faster on free-threaded Python'
+    )
     parser.add_argument(
         '-n', '--name',
         help='Name of a job'
@@ -150,6 +466,26 @@ def parse_args(args):
         default='output',
         help='folder to store generated job definitions'
     )
+    parser.add_argument(
+        '--output-file',
+        help='file to write all the jobs and views to, as one YAML list,'
+             ' instead of one file each in --output-dir. "-" writes them to'
+             ' stdout'
+    )
+    parser.add_argument(
+        '--macros',
+        type=int, metavar='MIN_JOBS',
+        help='turn the builders, publishers, wrappers and SCMs found in at'
+             ' least MIN_JOBS jobs into macros, written to @macros.yml, that'
+             ' the jobs use by name'
+    )
+    parser.add_argument(
+        '--templates',
+        type=int, metavar='MIN_JOBS',
+        help='turn groups of at least MIN_JOBS jobs that only differ in a'
+             ' few values into job templates and projects, written to'
+             ' @templates'
+    )
     parser.add_argument(
         '-v', '--verbose',
         action='store_true', default=None,
@@ -166,7 +502,61 @@ def parse_args(args):
         action='store_true', default=False,
         help="will replace tab escape character with spaces"
     )
-    return parser.parse_args(args)
+    parser.add_argument(
+        '--parser',
+        choices=xmlparser.BACKENDS,
+        help="XML parser. lxml is faster and uses less memory on very large"
+             " configs (default: etree)"
+    )
+    parser.add_argument(
+        '--recover',
+        action='store_true', default=False,
+        help="convert as much as possible of broken XML instead of failing."
+             " Implies --parser lxml"
+    )
+    parser.add_argument(
+        '--memo-size',
+        type=int, default=MEMO_SIZE,
+        help="number of distinct top-level XML elements (<publishers>,"
+             " <scm>, ...) to remember the conversions of, so that the ones"
+             " shared by many jobs are converted once. 0 disables it"
+    )
+    parser.add_argument(
+        '--plugin-cache',
+        help="file to cache discovered plugins in, between runs. It is"
+             " refreshed when installed packages change"
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int, default=1,
+        help="number of jobs or views to fetch from the Jenkins server, or"
+             " read from --jenkins-home, at once"
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true', default=False,
+        help="only convert the jobs and views that changed since the last"
+             " run with this option, and report the ones that were removed."
+             " Needs -s, --jenkins-home or --jenkins-archive"
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help="folder to cache job and view configs from the Jenkins server"
+             " in, and the YAML of every job and view. Later runs only"
+             " download the configs that changed, and only convert the jobs"
+             " and views that did"
+    )
+    parser.add_argument(
+        '--cache-size',
+        type=int, default=1024,
+        help="size limit of each cache in MiB. The least recently used"
+             " entries are removed past it"
+    )
+    args = parser.parse_args(args)
+    if args.incremental and (args.filename or args.batch):
+        parser.error('--incremental needs -s, --jenkins-home or'
+                     ' --jenkins-archive')
+    return args
 
 
 def main():
@@ -174,20 +564,49 @@ def main():
     if args.verbose:
         log.setLevel(logging.DEBUG)
 
-    setup_str_presenter(args.replace_tabs)
+    if args.plugin_cache:
+        get_registry().load_snapshot(args.plugin_cache)
+
+    result_cache = None
+    if args.cache_dir:
+        result_cache = ResultCache(os.path.join(args.cache_dir, 'results'),
+                                   max_size=args.cache_size * 1024 * 1024,
+                                   converter=get_registry().converter_key())
+    setup_str_presenter(args.replace_tabs, args.memo_size, result_cache)
+
+    if args.parser or args.recover:
+        backend = args.parser or 'lxml'
+        try:
+            xmlparser.set_backend(backend, recover=args.recover)
+        except ValueError as err:
+            log.critical('Cannot use the %s XML parser: %s' % (backend, err))
+            exit(1)
+        if args.recover and xmlparser.get_backend() != 'lxml':
+            log.critical('--recover needs the lxml XML parser.')
+            exit(1)
 
     # Options:
     # -f and -n
     # -s and -n/-u
     # -s (without -n means "all jobs on the server")
-    # Choose either -f or -s ...
-    if not args.jenkins_server and not args.filename:
-        log.critical('Choose an XML file (-f) or Jenkins URL (-s).')
+    # --jenkins-home or --jenkins-archive, optionally with -n/-u
+    # -b
+    # Choose either -f, -s, --jenkins-home, --jenkins-archive or -b ...
+    sources = [source for source in (args.filename, args.jenkins_server,
+                                     args.jenkins_home, args.jenkins_archive,
+                                     args.batch)
+               if source]
+    if not sources:
+        log.critical('Choose an XML file (-f), Jenkins URL (-s), Jenkins'
+                     ' home directory (--jenkins-home), backup'
+                     ' (--jenkins-archive) or batch of XML files (-b).')
         exit(1)
 
-    # ... but not both -f and -s.
-    if args.jenkins_server and args.filename:
-        log.critical('Choose either an XML file (-f) or Jenkins URL (-s).')
+    # ... but only one of them.
+    if len(sources) > 1:
+        log.critical('Choose only one of an XML file (-f), Jenkins URL (-s),'
+                     ' Jenkins home directory (--jenkins-home), backup'
+                     ' (--jenkins-archive) or batch of XML files (-b).')
         exit(1)
 
     # -f requires -n
@@ -196,119 +615,287 @@ def main():
                      ' in this file.')
         exit(1)
 
-    # Args are ok. Proceed with writing output
-    try:
-        os.mkdir(args.output_dir)
-    # We don't care if "output" dir already exists.
-    except OSError as exception:
-        if exception.errno != errno.EEXIST:
-            raise
+    # --incremental needs one file per job or view
+    if args.incremental and args.output_file:
+        log.critical('Choose either --incremental or --output-file.')
+        exit(1)
 
-    if args.filename:
-        # Convert to YAML
-        root = get_xml_root(filename=args.filename)
-        yaml = root_to_yaml(root, args.name, args.ignore_actions_tag)
-        # Create output directory structure where needed
-        yaml_filename = os.path.join(args.output_dir, args.name + '.yml')
-        path = os.path.dirname(yaml_filename)
+    # Args are ok. Proceed with writing output
+    if args.output_file:
+        writer = StreamWriter(args.output_file)
+    else:
         try:
-            os.makedirs(path)
-        except OSError as exc:  # Python >2.5
-            if exc.errno == errno.EEXIST and os.path.isdir(path):
-                pass
-            else:
+            os.mkdir(args.output_dir)
+        # We don't care if "output" dir already exists.
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
                 raise
-        # Write to output file
-        output_file = open(yaml_filename, 'w')
-        output_file.write(yaml)
-        output_file.close()
+        writer = OutputWriter(args.output_dir)
+    if args.macros or args.templates:
+        from jenkins_job_wrecker.macros import MacroWriter
+        writer = MacroWriter(writer, args.macros, args.templates)
+
+    with writer:
+        failed = convert(args, writer)
+    if args.output_file != '-':
+        log.info(writer.summary())
+    context = get_context()
+    # Nothing to say about a memo that reused nothing, like in most -f runs
+    memo = context.memo
+    if memo is not None and memo.stats['hits']:
+        log.info(memo.summary())
+    cache = context.result_cache
+    if cache is not None and cache.stats['hits'] + cache.stats['misses']:
+        log.info(cache.summary())
+    if failed:
+        exit(1)
 
-    # -s requires -n
+
+def convert(args, writer):
+    """
+    Convert the jobs and views chosen on the command line, and write them
+    with "writer". Returns the number of files of a batch that failed.
+    """
+    failed = 0
+    if args.filename:
+        # Convert to YAML while reading the file, and write it as it is
+        # emitted
+        with writer.open(args.name) as output_file:
+            cached_stream_to_yaml(lambda: file_digest(args.filename),
+                                  iter_file(args.filename), args.name,
+                                  args.ignore_actions_tag, output_file)
+
+    if args.batch:
+        failed = convert_batch(args, writer)
+
+    # Convert every job and view of a Jenkins server or JENKINS_HOME
+    configs = None
     if args.jenkins_server:
-        # 'http://jenkins-calamari.front.sepia.ceph.com:8080'
-        # TODO: make these configurable. Allow environment variables for now
-        username = None
-        password = None
-        try:
-            username = os.environ['JJW_USERNAME']
-            password = os.environ['JJW_PASSWORD']
-        except KeyError as err:
-            log.warning('%s was not set as an environment variable to '
-                        'connect to Jenkins' % err)
-
-        server = jenkins.Jenkins(args.jenkins_server,
-                                 username=username,
-                                 password=password)
-
-        if args.name:
-            job_names = [args.name]
-        elif not args.view:
-            job_names = []
-            # Folder depth of None means go down indefinitely
-            for job in server.get_jobs(folder_depth=None):
-                if args.ignore and job['name'] in args.ignore:
-                    log.info('Ignoring \"%s\" as requested...' % job['name'])
-                    continue
-
-                job_names.append(job['fullname'])
-        else:
-            job_names = []
-
-        if args.view:
-            view_names = [args.view]
-        elif not args.name:
-            view_names = []
-            for view in server.get_views():
-                if args.ignore and view['name'] in args.ignore:
-                    log.info('Ignoring \"%s\" as requested...' % view['name'])
-                    continue
-
-                if view['name'] != 'all':
-                    view_names.append(view['name'])
+        configs = server_configs(args)
+    elif args.jenkins_home:
+        configs = jenkins_home_configs(args)
+    elif args.jenkins_archive:
+        configs = jenkins_archive_configs(args)
+    if configs is not None:
+        manifest = None
+        if args.incremental:
+            # The XML parser too: --recover makes YAML of broken XML.
+            backend = xmlparser.get_backend()
+            options = ' '.join(option for option, enabled in
+                               (('-a', args.ignore_actions_tag),
+                                ('-t', args.replace_tabs),
+                                ('--parser ' + backend, backend != 'etree'),
+                                ('--recover',
+                                 xmlparser.get_options()['recover']))
+                               if enabled)
+            # The same converter key as the result cache, if there is one
+            cache = get_context().result_cache
+            if cache is not None:
+                converter = cache.converter
+            else:
+                converter = get_registry().converter_key()
+            manifest = Manifest(args.output_dir, options, converter)
+
+        convert_to_yml(configs, args, manifest, writer)
+
+        if manifest:
+            partial = bool(args.name or args.view)
+            if not partial:
+                for entry in manifest.removed():
+                    log.info('%s "%s" was removed since the last run,'
+                             ' see %s' % (entry['type'], entry['name'],
+                                          entry['output']))
+            manifest.save(partial)
+    return failed
+
+
+def ignored(args, name):
+    """ Return True if the job or view "name" was ignored with -i. """
+    if args.ignore and name in args.ignore:
+        log.info('Ignoring \"%s\" as requested...' % name)
+        return True
+    return False
+
+
+def server_configs(args):
+    """
+    Yield (element_type, fullname, xml) for the jobs and views to convert
+    from a Jenkins server (-s).
+    """
+    # 'http://jenkins-calamari.front.sepia.ceph.com:8080'
+    # TODO: make these configurable. Allow environment variables for now
+    username = None
+    password = None
+    try:
+        username = os.environ['JJW_USERNAME']
+        password = os.environ['JJW_PASSWORD']
+    except KeyError as err:
+        log.warning('%s was not set as an environment variable to '
+                    'connect to Jenkins' % err)
+
+    cache = None
+    if args.cache_dir:
+        cache = ConfigCache(os.path.join(args.cache_dir, 'configs'),
+                            max_size=args.cache_size * 1024 * 1024)
+    fetcher = ConfigFetcher(args.jenkins_server,
+                            username=username,
+                            password=password,
+                            cache=cache)
+
+    if not args.name and not args.view:
+        # List all jobs, folders and views in as few requests as possible
+        jobs, views = fetcher.inventory()
+
+    if args.name:
+        job_names = [args.name]
+    elif not args.view:
+        job_names = [job['fullname'] for job in jobs
+                     if not ignored(args, job['name'])]
+    else:
+        job_names = []
+
+    if args.view:
+        view_names = [args.view]
+    elif not args.name:
+        view_names = [view['name'] for view in views
+                      if not ignored(args, view['name'])
+                      and view['name'] != 'all']
+    else:
+        view_names = []
+
+    def fetch(item):
+        element_type, fullname = item
+        log.info('looking up %s "%s"' % (element_type, fullname))
+        return element_type, fullname, fetcher.fetch(element_type, fullname)
+
+    # Configs are fetched on worker threads, but converted in this order.
+    items = [('job', name) for name in job_names]
+    items.extend(('view', name) for name in view_names)
+    return ordered_map(fetch, items, args.workers)
+
+
+def jenkins_home_configs(args):
+    """
+    Yield (element_type, fullname, xml) for the jobs and views to convert
+    from a JENKINS_HOME directory (--jenkins-home).
+    """
+    def read(item):
+        fullname, filename = item
+        log.info('reading job "%s"' % fullname)
+        with open(filename, 'rb') as f:
+            return 'job', fullname, f.read()
+
+    if not args.view:
+        jobs = jenkins_home_jobs(os.path.join(args.jenkins_home, 'jobs'))
+        jobs = (job for job in jobs
+                if (job[0] == args.name if args.name
+                    else not ignored(args, job[0].split('/')[-1])))
+        # Files are read on worker threads, but converted in this order.
+        for config in ordered_map(read, jobs, args.workers):
+            yield config
+
+    if not args.name:
+        for name, xml in jenkins_home_views(args.jenkins_home):
+            if name == args.view if args.view else not ignored(args, name):
+                yield 'view', name, xml
+
+
+def jenkins_archive_configs(args):
+    """
+    Yield (element_type, fullname, xml) for the jobs and views to convert
+    from a backup archive of a JENKINS_HOME (--jenkins-archive).
+    """
+    # io objects, which have seekable() on Python 2 too
+    if args.jenkins_archive == '-':
+        if PY2:
+            fileobj = io.open(sys.stdin.fileno(), 'rb', closefd=False)
         else:
-            view_names = []
-
-        def convert_to_yml(job_names, element_type, output_dir='output'):
-            """
-            Takes a list of job or view names and converts them all to YAML and
-            writes them to a file.
-
-            :param list[str] job_names: Either job names or view names to get
-                configs for from the server.
-            :param str element_type: The type of job_names. Either 'job' or
-                'view' currently.
-            :param str output_dir: The directory to write the files to.
-            """
-            for fullname in job_names:
-                log.info('looking up %s "%s"' % (element_type, fullname))
-                # Get a job's XML
-                if element_type == 'job':
-                    xml = server.get_job_config(fullname)
-                elif element_type == 'view':
-                    xml = server.get_view_config(fullname)
-                else:
-                    log.critical('Invalid element_type.')
-                    exit(1)
-                log.debug(xml)
-                # Convert XML to YAML
-                root = get_xml_root(string=xml)
-                log.info('converting %s "%s"' % (element_type, fullname))
-                yaml = root_to_yaml(root, fullname, args.ignore_actions_tag)
-                # Create output directory structure where needed
-                yaml_filename = os.path.join(output_dir, fullname + '.yml')
-                path = os.path.dirname(yaml_filename)
-                try:
-                    os.makedirs(path)
-                except OSError as exc:  # Python >2.5
-                    if exc.errno == errno.EEXIST and os.path.isdir(path):
-                        pass
-                    else:
-                        raise
-                # Write to output file
-                output_file = open(yaml_filename, 'w')
-                output_file.write(yaml)
-                output_file.close()
-
-        convert_to_yml(job_names, 'job', output_dir=args.output_dir)
-        convert_to_yml(view_names, 'view',
-                       output_dir=os.path.join(args.output_dir, 'views'))
+            fileobj = sys.stdin.buffer
+        close = False
+    else:
+        fileobj = io.open(args.jenkins_archive, 'rb')
+        close = True
+    try:
+        for element_type, name, xml in archive_configs(fileobj):
+            if element_type == 'job':
+                selected = not args.view and (
+                    name == args.name if args.name
+                    else not ignored(args, name.split('/')[-1]))
+            else:
+                selected = not args.name and (
+                    name == args.view if args.view
+                    else not ignored(args, name))
+            if selected:
+                yield element_type, name, xml
+    finally:
+        if close:
+            fileobj.close()
+
+
+def convert_to_yml(configs, args, manifest=None, writer=None):
+    """
+    Takes (element_type, fullname, xml) tuples of jobs and views, converts
+    them all to YAML and writes them to files under args.output_dir. Views
+    go to its "views" folder.
+
+    :param configs: (element_type, fullname, xml) tuples. element_type is
+        either 'job' or 'view'.
+    :param args: The parsed command line arguments.
+    :param manifest: A manifest.Manifest to skip unchanged jobs and views
+        and record the converted ones, or None.
+    :param writer: The writers.OutputWriter for args.output_dir, or None to
+        create one.
+    """
+    if writer is None:
+        writer = OutputWriter(args.output_dir)
+    for element_type, fullname, xml in configs:
+        log.debug(xml)
+        if manifest and manifest.is_current(element_type, fullname, xml):
+            log.info('%s "%s" is unchanged' % (element_type, fullname))
+            continue
+        # Convert XML to YAML, written to its file as it is emitted
+        log.info('converting %s "%s"' % (element_type, fullname))
+        name = fullname
+        if element_type == 'view':
+            name = 'views/' + fullname
+        with writer.open(name) as output_file:
+            cached_stream_to_yaml(lambda: xml_digest(xml), iter_chunks(xml),
+                                  fullname, args.ignore_actions_tag,
+                                  output_file)
+        if manifest:
+            manifest.record(element_type, fullname, xml,
+                            writer.filename(name))
+
+
+def convert_batch(args, writer):
+    """
+    Convert the XML files of a batch (-b) on a pool of processes and write
+    them with "writer". Returns the number of files that failed.
+    """
+    from jenkins_job_wrecker.batch import batch_files, convert_files
+    try:
+        items = batch_files(args.batch)
+    except (IOError, OSError, ValueError) as err:
+        log.critical('Cannot read batch %s: %s' % (args.batch, err))
+        exit(1)
+    items = [item for item in items
+             if not ignored(args, item[0].split('/')[-1])]
+
+    failed = 0
+    results = convert_files(items, args.ignore_actions_tag, args.processes,
+                            args.replace_tabs, args.plugin_cache,
+                            xmlparser.get_backend(), args.recover,
+                            args.threads, args.memo_size,
+                            get_context().result_cache)
+    for name, filename, output, error in results:
+        if error:
+            failed += 1
+            log.error('failed to convert %s: %s'
+                      % (filename, error.strip().splitlines()[-1]))
+            log.debug(error)
+            continue
+        log.info('converted job "%s"' % name)
+        writer.write(name, output)
+    log.info('converted %d of %d files' % (len(items) - failed, len(items)))
+    return failed
+
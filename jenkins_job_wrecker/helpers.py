@@ -1,5 +1,5 @@
 # encoding=utf8
-import xml.etree.ElementTree as ET
+from jenkins_job_wrecker.xmlparser import tostring
 
 
 def get_bool(txt):
@@ -9,7 +9,7 @@ def get_bool(txt):
 
 def gen_raw(xml, parent):
     raw = {}
-    raw['xml'] = ET.tostring(xml)
+    raw['xml'] = tostring(xml)
     parent.append({'raw': raw})
 
 
@@ -38,19 +38,16 @@ class Mapper(object):
 
 
 def replace_tab(s, tab_stop=4):
-    result = str()
-    pos = 0
-    for c in s:
-        if c == '\t':
-            aligned = ((pos + tab_stop - 1) // tab_stop) * tab_stop
-            if pos % tab_stop != 0:
-                num_spaces = aligned - pos
-            else:
-                num_spaces = tab_stop
-            co = ' ' * num_spaces
-            pos += num_spaces
-        else:
-            co = c
-            pos += 1
-        result = result + co
-    return result
+    # A tab moves to the next tab stop. Unlike str.expandtabs(), columns do
+    # not restart after line breaks.
+    if '\n' not in s and '\r' not in s:
+        return s.expandtabs(tab_stop)
+    parts = s.split('\t')
+    result = [parts[0]]
+    pos = len(parts[0])
+    for part in parts[1:]:
+        num_spaces = tab_stop - pos % tab_stop
+        result.append(' ' * num_spaces)
+        result.append(part)
+        pos += num_spaces + len(part)
+    return ''.join(result)
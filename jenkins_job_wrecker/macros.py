@@ -0,0 +1,411 @@
+# encoding=utf8
+"""
+Turn the builders, publishers, wrappers and SCMs that many jobs share into
+JJB macros, which the jobs then use by name.
+"""
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
+import os
+import re
+try:
+    # Python 2: PyYAML writes native strings, which io.StringIO refuses.
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import yaml
+
+from jenkins_job_wrecker.cli import dump_yaml, get_context, string_types
+from jenkins_job_wrecker.memo import copy_data
+from jenkins_job_wrecker.templates import TEMPLATES_DIR, TemplateIndex, \
+    expand_templates
+from jenkins_job_wrecker.writers import StreamWriter
+
+try:
+    from yaml import CSafeLoader as Loader
+except ImportError:
+    from yaml import SafeLoader as Loader
+
+log = logging.getLogger('jjwrecker')
+
+# Job settings holding a list of blocks, and the type of their macros
+COMPONENTS = [('builders', 'builder'), ('publishers', 'publisher'),
+              ('wrappers', 'wrapper'), ('scm', 'scm')]
+
+# Blocks smaller than this, in characters of JSON, are not worth a macro.
+MIN_SIZE = 64
+
+# Name of the file of macros in the output directory, without ".yml". "@"
+# cannot appear in a Jenkins job name, so no job is written to this file.
+MACROS_NAME = '@macros'
+
+UNSAFE_CHARACTERS = re.compile(r'[^A-Za-z0-9_.-]')
+
+# A string of a job template holding a parameter, in the JSON of a block.
+# Macros do not see the parameters of the template that uses them.
+TEMPLATE_PARAMETER = re.compile(r'"\{\w+\}"')
+
+
+def block_hash(block):
+    """
+    Return a hash of the structure and values of a block, and the JSON
+    that was hashed.
+    """
+    canonical = json.dumps(block, sort_keys=True, ensure_ascii=False,
+                           separators=(',', ':'), default=repr)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest(), canonical
+
+
+class MacroIndex(object):
+    """
+    Counts the blocks (the items of "builders", "publishers", "wrappers"
+    and "scm") of every job it is given with add(), by block_hash(). The
+    blocks found in at least "min_count" jobs become macros.
+
+    Identical blocks of different jobs are replaced by one shared object,
+    so a fleet of jobs full of duplicates takes little memory.
+    """
+
+    def __init__(self, min_count=2):
+        self.min_count = min_count
+        # (component, digest) -> [block, number of jobs, size]
+        self.blocks = {}
+        # id() of the shared blocks -> (component, digest)
+        self.keys = {}
+        # (component, digest) -> macro name, see assign()
+        self.names = {}
+
+    def add(self, job):
+        """ Index the blocks of a job, a dict of its settings. """
+        seen = set()
+        for component, _ in COMPONENTS:
+            blocks = job.get(component)
+            if not isinstance(blocks, list):
+                continue
+            for i, block in enumerate(blocks):
+                if not isinstance(block, dict):
+                    continue
+                digest, canonical = block_hash(block)
+                if TEMPLATE_PARAMETER.search(canonical):
+                    continue
+                key = (component, digest)
+                entry = self.blocks.get(key)
+                if entry is None:
+                    entry = self.blocks[key] = [block, 0, len(canonical)]
+                    self.keys[id(block)] = key
+                blocks[i] = entry[0]
+                if key not in seen:
+                    entry[1] += 1
+                    seen.add(key)
+
+    def assign(self):
+        """
+        Name a macro after each block found in enough jobs, like
+        "shell-1a2b3c4d": its type and the start of its hash, so a block
+        keeps its name from one run to the next.
+        """
+        self.names = {}
+        if not self.min_count:
+            return 0
+        taken = set()
+        for key in sorted(self.blocks):
+            block, count, size = self.blocks[key]
+            if count < self.min_count or size < MIN_SIZE:
+                continue
+            component, digest = key
+            kind = UNSAFE_CHARACTERS.sub('-', next(iter(block), 'macro'))
+            length = 8
+            name = '%s-%s' % (kind, digest[:length])
+            while (component, name) in taken:
+                length += 1
+                name = '%s-%s' % (kind, digest[:length])
+            taken.add((component, name))
+            self.names[key] = name
+        return len(self.names)
+
+    def apply(self, job):
+        """
+        Replace the blocks of a job that became macros by their names.
+        Returns True if the job changed.
+        """
+        changed = False
+        for component, _ in COMPONENTS:
+            blocks = job.get(component)
+            if not isinstance(blocks, list):
+                continue
+            for i, block in enumerate(blocks):
+                if not isinstance(block, dict):
+                    continue
+                name = self.names.get(self.keys.get(id(block)))
+                if name is None:
+                    # PyYAML writes an alias for a block repeated in a job.
+                    blocks[i] = copy_data(block)
+                else:
+                    blocks[i] = name
+                    changed = True
+        return changed
+
+    def macros(self):
+        """ Return the definitions of the macros, in JJB's format. """
+        definitions = []
+        macro_types = dict(COMPONENTS)
+        for key, name in sorted(self.names.items(),
+                                key=lambda item: (item[0][0], item[1])):
+            component = key[0]
+            block = copy_data(self.blocks[key][0])
+            definitions.append({macro_types[component]: {
+                'name': name, component: [block]}})
+        return definitions
+
+
+def expand(job, macros):
+    """
+    Replace the names of "macros", a dict of (component, name) to blocks,
+    in a job by their blocks again. Returns True if the job changed.
+    """
+    changed = False
+    for component, _ in COMPONENTS:
+        blocks = job.get(component)
+        if not isinstance(blocks, list):
+            continue
+        expanded = []
+        for block in blocks:
+            if isinstance(block, string_types) and \
+                    (component, block) in macros:
+                expanded.extend(copy_data(macros[(component, block)]))
+                changed = True
+            else:
+                expanded.append(block)
+        job[component] = expanded
+    return changed
+
+
+def load_macros(documents):
+    """
+    Return the macros defined in a list of JJB definitions, as a dict of
+    (component, name) to blocks, for expand().
+    """
+    macros = {}
+    for definition in documents or ():
+        for component, macro in COMPONENTS:
+            body = definition.get(macro) if isinstance(definition,
+                                                       dict) else None
+            if isinstance(body, dict) and 'name' in body:
+                macros[(component, body['name'])] = body.get(component, [])
+    return macros
+
+
+def jobs_of(documents):
+    """
+    Yield the settings of the jobs and job templates of a list of JJB
+    definitions.
+    """
+    for definition in documents or ():
+        if not isinstance(definition, dict):
+            continue
+        for kind in ('job', 'job-template'):
+            if isinstance(definition.get(kind), dict):
+                yield definition[kind]
+
+
+class MacroWriter(object):
+    """
+    Wraps the writer of a run to extract macros: it keeps every job and
+    view it is given, and only writes them, with the macros, on close().
+    No macros are made when "min_count" is None.
+
+    With "templates", the groups of at least that many jobs that only
+    differ in a few values become job templates first, see
+    templates.TemplateIndex, each in a file of TEMPLATES_DIR.
+
+    With an output directory, the jobs already there (from earlier runs,
+    or skipped by --incremental) count as well, and the macros and
+    templates of the previous run are expanded in them first.
+    """
+
+    def __init__(self, writer, min_count=2, templates=None):
+        self.writer = writer
+        self.index = MacroIndex(min_count)
+        self.templates = templates
+        # name -> (documents, the YAML they were read from or None, True if
+        # it must be written, True if the documents changed since)
+        self.documents = {}
+        # Names of the files to remove, unless written again
+        self.removed = set()
+        # Size of the YAML given to the writer, or found in its directory
+        self.size = 0
+        self.stats = writer.stats
+
+    def filename(self, name):
+        return self.writer.filename(name)
+
+    @contextmanager
+    def open(self, name):
+        """
+        Return a text stream to write the YAML of job or view "name" to. It
+        is kept when the "with" block completes without an exception.
+        """
+        stream = StringIO()
+        yield stream
+        self.write(name, stream.getvalue())
+
+    def write(self, name, output):
+        """ Keep the YAML of job or view "name", and return its file. """
+        self.add(name, yaml.load(output, Loader=Loader), output, True)
+        return self.filename(name)
+
+    def add(self, name, documents, text, write, changed=False, size=None):
+        """
+        Keep the documents of "name", read from the YAML "text". "size" is
+        the size of their YAML without macros or templates, if not "text".
+        """
+        if not self.templates:
+            # Otherwise jobs are indexed once in templates.
+            for job in jobs_of(documents):
+                self.index.add(job)
+        self.documents[name] = (documents, text, write, changed)
+        self.size += len(text) if size is None else size
+
+    def load_output_dir(self):
+        """
+        Add the YAML files of the output directory that were not converted
+        in this run, with the macros of the previous run expanded in them,
+        and the jobs of the job templates of the previous run.
+        """
+        output_dir = self.writer.output_dir
+        context = get_context()
+        macros = {}
+        path = self.filename(MACROS_NAME)
+        if os.path.exists(path):
+            with open(path) as f:
+                macros = load_macros(yaml.load(f, Loader=Loader))
+        for dirpath, dirnames, filenames in os.walk(output_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith('.yml'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, output_dir)[:-len('.yml')]
+                name = name.replace(os.sep, '/')
+                if name == MACROS_NAME or name in self.documents:
+                    continue
+                try:
+                    with open(path) as f:
+                        text = f.read()
+                    documents = yaml.load(text, Loader=Loader)
+                except (IOError, OSError, yaml.YAMLError) as err:
+                    log.warning('cannot read %s for macros: %s'
+                                % (path, err))
+                    continue
+                changed = False
+                for job in jobs_of(documents):
+                    changed = expand(job, macros) or changed
+                if name.startswith(TEMPLATES_DIR + '/'):
+                    self.removed.add(name)
+                    for job in expand_templates(documents):
+                        if job['name'] not in self.documents:
+                            job_documents = [{'job': job}]
+                            self.add(job['name'], job_documents,
+                                     dump_yaml(job_documents,
+                                               context=context), True)
+                    continue
+                size = None
+                if changed:
+                    # Every run counts the size of the jobs without macros.
+                    size = len(dump_yaml(documents, context=context))
+                self.add(name, documents, text, False, changed, size)
+
+    def make_templates(self):
+        """
+        Replace the groups of jobs that only differ in a few values by
+        job templates. Returns the templates.
+        """
+        index = TemplateIndex(self.templates)
+        for name, entry in sorted(self.documents.items()):
+            documents = entry[0]
+            if len(documents or ()) == 1 and \
+                    isinstance(documents[0], dict) and \
+                    isinstance(documents[0].get('job'), dict):
+                index.add(name, documents[0]['job'])
+        templates = index.templates()
+        for template in templates:
+            for name in template.names:
+                del self.documents[name]
+                self.removed.add(name)
+            self.documents[TEMPLATES_DIR + '/' + template.id] = (
+                template.definitions(), None, True, True)
+        for entry in self.documents.values():
+            for job in jobs_of(entry[0]):
+                self.index.add(job)
+        return templates
+
+    def close(self, complete=True):
+        """
+        Make the templates and extract the macros, and write them with
+        every job and view that changed, if "complete". Then close the
+        wrapped writer.
+        """
+        if complete:
+            output_dir = not isinstance(self.writer, StreamWriter)
+            if output_dir:
+                self.load_output_dir()
+            if self.templates:
+                templates = self.make_templates()
+                log.info('made %d job templates of %d jobs'
+                         % (len(templates),
+                            sum(len(template.names)
+                                for template in templates)))
+            count = self.index.assign()
+            context = get_context()
+            size = 0
+            for name in sorted(self.documents):
+                documents, text, write, changed = self.documents.pop(name)
+                for job in jobs_of(documents):
+                    changed = self.index.apply(job) or changed
+                # The YAML of a job that is loaded and dumped again is not
+                # always the same: only dump the jobs that changed, and not
+                # the files that got their own macros back.
+                if changed and (write or text is None or
+                                yaml.load(text, Loader=Loader) != documents):
+                    text = dump_yaml(documents, context=context)
+                if write or changed:
+                    self.writer.write(name, text)
+                    self.removed.discard(name)
+                size += len(text)
+            macros = self.index.macros()
+            if macros:
+                output = dump_yaml(macros, context=context)
+                self.writer.write(MACROS_NAME, output)
+                size += len(output)
+            else:
+                self.removed.add(MACROS_NAME)
+            if output_dir:
+                self.remove()
+            if self.index.min_count:
+                log.info('extracted %d macros' % count)
+            log.info('%d KiB of YAML instead of %d KiB'
+                     % (size // 1024, self.size // 1024))
+        self.writer.close(complete)
+
+    def remove(self):
+        """
+        Remove the files of "removed", and the folder of templates if no
+        template is left.
+        """
+        for name in sorted(self.removed):
+            if os.path.exists(self.filename(name)):
+                os.unlink(self.filename(name))
+        path = os.path.join(self.writer.output_dir, TEMPLATES_DIR)
+        if os.path.isdir(path) and not os.listdir(path):
+            os.rmdir(path)
+
+    def summary(self):
+        return self.writer.summary()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(exc_type is None)
@@ -0,0 +1,88 @@
+# encoding=utf8
+import hashlib
+import json
+import os
+import tempfile
+from jenkins_job_wrecker.registry import converter_key
+
+
+def config_hash(xml):
+    """ Return the hash of a job or view config, as a hex string. """
+    if not isinstance(xml, bytes):
+        xml = xml.encode('utf-8')
+    return hashlib.sha256(xml).hexdigest()
+
+
+class Manifest(object):
+    """
+    Record of what a run converted: for each job and view, the hash of its
+    config, the converter that produced its YAML (converter_key() and the
+    conversion options) and the output file.
+
+    The next run only needs to convert the jobs and views whose config or
+    converter changed since, see is_current().
+    """
+    FILENAME = '.jjwrecker-manifest.json'
+
+    def __init__(self, output_dir, options='', converter=None):
+        self.path = os.path.join(output_dir, self.FILENAME)
+        if converter is None:
+            converter = converter_key()
+        # Conversion options change the output like a new version would.
+        self.converter = ' '.join([converter, options]).strip()
+        try:
+            with open(self.path) as f:
+                self.old = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.old = {}
+        self.new = {}
+
+    @staticmethod
+    def key(element_type, fullname):
+        return '%s:%s' % (element_type, fullname)
+
+    def is_current(self, element_type, fullname, xml):
+        """
+        Return True if the output of the previous run for this job or view
+        is still up to date. It is then kept in the new manifest.
+        """
+        key = self.key(element_type, fullname)
+        entry = self.old.get(key)
+        if entry is None \
+                or entry['hash'] != config_hash(xml) \
+                or entry['converter'] != self.converter \
+                or not os.path.exists(entry['output']):
+            return False
+        self.new[key] = entry
+        return True
+
+    def record(self, element_type, fullname, xml, output):
+        """ Record the conversion of a job or view to the "output" file. """
+        self.new[self.key(element_type, fullname)] = {
+            'type': element_type,
+            'name': fullname,
+            'hash': config_hash(xml),
+            'converter': self.converter,
+            'output': output,
+        }
+
+    def removed(self):
+        """
+        Return the entries of the previous run for jobs and views that this
+        run did not see.
+        """
+        return [entry for key, entry in sorted(self.old.items())
+                if key not in self.new]
+
+    def save(self, partial=False):
+        """
+        Write the manifest. When this run only looked at some jobs or views
+        ("partial"), keep the previous entries of the others.
+        """
+        entries = dict(self.old) if partial else {}
+        entries.update(self.new)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(self.path),
+                                    suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f, indent=1, sort_keys=True)
+        os.rename(temp, self.path)
@@ -0,0 +1,139 @@
+# encoding=utf8
+"""
+Remember the conversions of identical XML subtrees during a run.
+
+Many jobs share byte-identical <publishers>, <buildWrappers>, <properties>
+or <scm> blocks. The converted settings of a top-level element only depend
+on its contents, so each distinct block only needs to be converted once.
+"""
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+from jenkins_job_wrecker import xmlparser
+
+# Default number of subtrees to remember.
+DEFAULT_SIZE = 10000
+
+# Number of elements of a tag to try the memo on, before it stops hashing
+# that tag if reusing conversions did not save any time so far.
+PROBES = 64
+# After that, one element of the tag in SAMPLE still tries the memo, in
+# case later ones are slower to convert.
+SAMPLE = 16
+
+
+def subtree_hash(element, *extra):
+    """
+    Return a digest of everything that a conversion of "element" can see,
+    see xmlparser.canonical(). "extra" values, like conversion options, are
+    part of the digest too.
+    """
+    digest = hashlib.sha256(xmlparser.canonical(element))
+    digest.update(repr(extra).encode('utf-8'))
+    return digest.digest()
+
+
+def copy_data(data):
+    """
+    Copy the lists and dicts of converted settings, so that whoever
+    receives them can change them without changing the memo.
+    """
+    if type(data) is list:
+        return [copy_data(item) for item in data]
+    if type(data) is dict:
+        return {key: copy_data(value) for key, value in data.items()}
+    return data
+
+
+class SubtreeMemo(object):
+    """
+    Converted settings of XML subtrees, keyed by subtree_hash(). Holds the
+    results of up to "size" subtrees, and evicts the least recently used
+    ones past that. Threads can share a memo.
+
+    Elements without children are always converted, as are most elements
+    of a tag for which the memo has not saved time, once it tried PROBES of
+    them: hashing those costs more than converting them.
+
+    "stats" counts the "hits" and "misses", and the seconds "saved": the
+    time the hits took to convert in the first place, less the time spent
+    hashing and copying.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        # digest -> (settings, seconds it took to convert them)
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'saved': 0.0}
+        # tag -> [lookups, seconds saved, elements skipped]
+        self.probes = {}
+
+    def convert(self, element, convert, *extra):
+        """
+        Return what convert() returns for "element", from the memo if an
+        identical subtree was converted already. "extra" values are part
+        of the key, see subtree_hash().
+        """
+        if not len(element):
+            return convert()
+        probe = self.probes.get(element.tag)
+        if probe is None:
+            with self.lock:
+                probe = self.probes.setdefault(element.tag, [0, 0.0, 0])
+        elif probe[0] >= PROBES and probe[1] <= 0:
+            probe[2] += 1
+            if probe[2] % SAMPLE:
+                return convert()
+
+        start = time.time()
+        key = subtree_hash(element, *extra)
+        with self.lock:
+            entry = self.results.get(key)
+            if entry is not None:
+                # Most recently used last (no move_to_end() on Python 2)
+                self.results[key] = self.results.pop(key)
+        if entry is not None:
+            result, cost = entry
+            result = copy_data(result)
+            self.record(probe, 'hits', cost - (time.time() - start))
+            return result
+
+        hashed = time.time()
+        result = convert()
+        converted = time.time()
+        entry = (copy_data(result), converted - hashed)
+        with self.lock:
+            self.results[key] = entry
+            if len(self.results) > self.size:
+                self.results.popitem(last=False)
+        self.record(probe, 'misses', converted - time.time() + start - hashed)
+        return result
+
+    def record(self, probe, outcome, saved):
+        with self.lock:
+            self.stats[outcome] += 1
+            self.stats['saved'] += saved
+            probe[0] += 1
+            probe[1] += saved
+
+    def add_stats(self, stats):
+        """ Add the "stats" of another memo, like a worker process's. """
+        with self.lock:
+            for key, value in stats.items():
+                self.stats[key] += value
+
+    def summary(self):
+        """ Describe "stats" in one line. """
+        stats = self.stats
+        lookups = stats['hits'] + stats['misses']
+        rate = 100.0 * stats['hits'] / lookups if lookups else 0.0
+        # Hashing elements that are never reused only costs time.
+        if stats['saved'] < 0:
+            effect = 'at a cost of %.2fs' % -stats['saved']
+        else:
+            effect = 'saving %.2fs' % stats['saved']
+        return ('reused %d of %d converted elements (%.0f%%), %s'
+                % (stats['hits'], lookups, rate, effect))
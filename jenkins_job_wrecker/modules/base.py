@@ -6,6 +6,22 @@ class Base(object):
     def __init__(self, registry):
         self.registry = registry
         self.registry.register(self.component)
+        # Raw XML tag -> converter, see converter(). Threads sharing a
+        # frozen registry may both fill in a tag, with the same converter.
+        self.converters = {}
+
+    def converter(self, key):
+        """
+        Return the converter for a raw XML tag, compiling it on first use.
+        """
+        convert = self.converters.get(key)
+        if convert is None:
+            convert = self.converters[key] = self.compile(key)
+        return convert
+
+    def compile(self, tag):
+        name = tag.split('.')[-1].lower()
+        return self.registry.converter(self.component, name)
 
     def gen_xml(self, yml_parent, data):
         pass
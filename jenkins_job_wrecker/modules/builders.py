@@ -8,8 +8,7 @@ class Builders(jenkins_job_wrecker.modules.base.Base):
     def gen_yml(self, yml_parent, data):
         builders = []
         for child in data:
-            object_name = child.tag.split('.')[-1].lower()
-            self.registry.dispatch(self.component, object_name, child, builders)
+            self.converter(child.tag)(child, builders)
         yml_parent.append(['builders', builders])
 
 
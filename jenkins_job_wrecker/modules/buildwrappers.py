@@ -8,8 +8,7 @@ class Buildwrappers(jenkins_job_wrecker.modules.base.Base):
     def gen_yml(self, yml_parent, data):
         wrappers = []
         for child in data:
-            object_name = child.tag.split('.')[-1].lower()
-            self.registry.dispatch(self.component, object_name, child, wrappers)
+            self.converter(child.tag)(child, wrappers)
         yml_parent.append(['wrappers', wrappers])
 
 
@@ -1,35 +1,80 @@
 from __future__ import print_function
 
+import sys
+
 import jenkins_job_wrecker.modules.base
-from jenkins_job_wrecker.registry import Registry
 from jenkins_job_wrecker.helpers import get_bool
 
 
 class Handlers(jenkins_job_wrecker.modules.base.Base):
     component = 'handlers'
 
-    def gen_yml(self, yml_parent, data):
+    def gen_yml(self, yml_parent, data, ignore_actions=None, memo=None):
         for child in data:
-            handler_name = child.tag.lower()
-            settings = []
-            try:
-                self.registry.dispatch(self.component, handler_name, child, settings)
-                if not settings:
-                    continue
-                for setting in settings:
-                    key, value = setting
-                    if key in yml_parent:
-                        if not value:
-                            continue
-                        if type(yml_parent[key]) is dict:
-                            yml_parent[key].update(value)
-                        elif type(yml_parent[key]) is list:
-                            yml_parent[key].append(value[0])
-                    else:
-                        yml_parent[key] = value
-            except Exception:
-                print('last called %s' % handler_name)
-                raise
+            self.gen_child(yml_parent, child, ignore_actions, memo)
+
+    def gen_child(self, yml_parent, child, ignore_actions=None, memo=None):
+        """
+        Convert one top-level element of a job into yml_parent. Streaming
+        conversion calls this as soon as each element is parsed.
+
+        With a SubtreeMemo, an element identical to one converted before
+        reuses its settings.
+        """
+        handler_name = child.tag.lower()
+        try:
+            if memo is None:
+                settings = self.convert_child(child, ignore_actions)
+            else:
+                settings = memo.convert(
+                    child, lambda: self.convert_child(child, ignore_actions),
+                    ignore_actions)
+            for setting in settings:
+                key, value = setting
+                if key in yml_parent:
+                    if not value:
+                        continue
+                    if type(yml_parent[key]) is dict:
+                        yml_parent[key].update(value)
+                    elif type(yml_parent[key]) is list:
+                        yml_parent[key].append(value[0])
+                else:
+                    yml_parent[key] = value
+        except Exception:
+            print('last called %s' % handler_name, file=sys.stderr)
+            raise
+
+    def convert_child(self, child, ignore_actions=None):
+        """ Return the settings of one top-level element of a job. """
+        settings = []
+        if child.tag.lower() == 'definition':
+            # Its children are top-level elements too, converted with the
+            # registry of this conversion.
+            self.definition(child, settings, ignore_actions)
+        else:
+            self.registry.dispatch(self.component, child.tag.lower(), child,
+                                   settings, ignore_actions)
+        return settings
+
+    def definition(self, top, parent, ignore_actions=None):
+        # sub-level "definition" data
+        definition = {}
+        if 'class' in top.attrib:  # Pipeline script
+            if top.attrib['class'] == 'org.jenkinsci.plugins.workflow.cps.CpsScmFlowDefinition':
+                #  Using pipeline-scm (getting jenkinsfile from repo)
+                parent.append(['pipeline-scm', definition])
+            elif top.attrib['class'] == 'org.jenkinsci.plugins.workflow.cps.CpsFlowDefinition':
+                # Using DSL (passing raw pipeline script)
+                for child in top.getchildren():
+                    if child.tag == 'script':
+                        parent.append(['dsl', child.text])
+                    elif child.tag == 'sandbox':
+                        parent.append(['sandbox', get_bool(child.text)])
+                # Don't pass anything to gen_yml, handled it here
+                top = ''
+        else:
+            parent.append(['definition', definition])
+        self.gen_yml(definition, top, ignore_actions)
 
 
 # Handle "<actions/>"
@@ -185,31 +230,3 @@ def childcustomworkspace(top, parent):
 
 def jdk(top, parent):
     parent.append(['jdk', top.text])
-
-
-def definition(top, parent):
-    reg = Registry()
-    handlers = Handlers(reg)
-    # Create register
-    reg = Registry()
-
-    # sub-level "definition" data
-    definition = {}
-    if 'class' in top.attrib:  # Pipeline script
-        if top.attrib['class'] == 'org.jenkinsci.plugins.workflow.cps.CpsScmFlowDefinition':
-            #  Using pipeline-scm (getting jenkinsfile from repo)
-            parent.append(['pipeline-scm', definition])
-        elif top.attrib['class'] == 'org.jenkinsci.plugins.workflow.cps.CpsFlowDefinition':
-            # Using DSL (passing raw pipeline script)
-            for child in top.getchildren():
-                if child.tag == 'script':
-                    parent.append(['dsl', child.text])
-                elif child.tag == 'sandbox':
-                    parent.append(['sandbox', get_bool(child.text)])
-            # Don't pass anything to handlers.gen_yml, handled it here
-            top = ''
-    else:
-        parent.append(['definition', definition])
-    reg = Registry()
-    handlers = Handlers(reg)
-    handlers.gen_yml(definition, top)
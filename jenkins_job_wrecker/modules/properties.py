@@ -18,27 +18,38 @@ class Properties(jenkins_job_wrecker.modules.base.Base):
     def gen_yml(self, yml_parent, data):
         parameters = []
         properties = []
+        targets = {'job': yml_parent,
+                   'parameters': parameters,
+                   'properties': properties}
         for child in data:
-            object_name = child.tag.split('.')[-1].lower()
-            object_name = object_name.replace('-', '').replace('_', '')
-            if object_name == 'parametersdefinitionproperty':
-                self.registry.dispatch(self.component, 'parameters', child, parameters)
-                continue
-            elif object_name == 'pipelinetriggersjobproperty':
-                # Pipeline scripts put triggers in properties section
-                trigger = Triggers(self.registry)
-                for grandchild in child:
-                    # Find the triggers tag and then generate the yaml
-                    if grandchild.tag == 'triggers':
-                        trigger.gen_yml(yml_parent, grandchild)
-                continue
-            self.registry.dispatch(self.component, object_name, child, properties)
+            target, convert = self.converter(child.tag)
+            convert(child, targets[target])
 
         if len(properties) > 0:
             yml_parent.append(['properties', properties])
         if len(parameters) > 0:
             yml_parent.append(['parameters', parameters])
 
+    def compile(self, tag):
+        # Return which list the element's settings go to, and its converter
+        object_name = tag.split('.')[-1].lower()
+        object_name = object_name.replace('-', '').replace('_', '')
+        if object_name == 'parametersdefinitionproperty':
+            return 'parameters', self.registry.converter(self.component,
+                                                         'parameters')
+        elif object_name == 'pipelinetriggersjobproperty':
+            return 'job', self.pipeline_triggers
+        return 'properties', self.registry.converter(self.component,
+                                                     object_name)
+
+    def pipeline_triggers(self, top, yml_parent):
+        # Pipeline scripts put triggers in properties section
+        trigger = self.registry.get_handler(Triggers)
+        for child in top:
+            # Find the triggers tag and then generate the yaml
+            if child.tag == 'triggers':
+                trigger.gen_yml(yml_parent, child)
+
 
 def githubprojectproperty(top, parent):
     github = {}
@@ -1,6 +1,8 @@
 # encoding=utf8
 from __future__ import print_function
 
+import sys
+
 import jenkins_job_wrecker.modules.base
 from jenkins_job_wrecker.helpers import get_bool
 
@@ -11,8 +13,7 @@ class Publishers(jenkins_job_wrecker.modules.base.Base):
     def gen_yml(self, yml_parent, data):
         publishers = []
         for child in data:
-            object_name = child.tag.split('.')[-1].lower()
-            self.registry.dispatch(self.component, object_name, child, publishers)
+            self.converter(child.tag)(child, publishers)
         yml_parent.append(['publishers', publishers])
 
 
@@ -101,7 +102,7 @@ def extendedemailpublisher(top, parent):
         elif element.tag == 'sendTo':
             ext_email['send-to'] = element.text
         elif element.tag == 'configuredTriggers':
-            print("IGNORED configuredTriggers in email-ext")
+            print("IGNORED configuredTriggers in email-ext", file=sys.stderr)
         else:
             raise NotImplementedError("cannot handle XML %s" % element.tag)
 
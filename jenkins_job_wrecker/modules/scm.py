@@ -6,27 +6,30 @@ class Scm(jenkins_job_wrecker.modules.base.Base):
     component = 'scm'
 
     def gen_yml(self, yml_parent, data):
-        scm = []
-        scm_class = None
-        if 'class' in data.attrib:
-            if data.attrib['class'] == 'hudson.scm.NullSCM':
-                return None
-            if data.attrib['class'] == 'org.jenkinsci.plugins.multiplescms.MultiSCM':
-                for scm in data[0]:
-                    self.gen_yml(yml_parent, scm)
-                return
-            scm_class = data.attrib['class'].split('.')[-1].lower()
-        scm_tag = data.tag.split('.')[-1].lower()
-        if scm_tag in self.registry.registry[self.component]:
-            self.registry.dispatch(self.component, scm_tag, data, scm)
-            yml_parent.append(['scm', scm])
-            return
-        if scm_class is not None and scm_class in self.registry.registry[self.component]:
-            self.registry.dispatch(self.component, scm_class, data, scm)
-            yml_parent.append(['scm', scm])
+        scm_class = data.get('class')
+        if scm_class == 'hudson.scm.NullSCM':
+            return None
+        if scm_class == 'org.jenkinsci.plugins.multiplescms.MultiSCM':
+            for scm in data[0]:
+                self.gen_yml(yml_parent, scm)
             return
-
-        raise NotImplementedError('%s scm not supported' % data.attrib['class'])
+        convert = self.converter((data.tag, scm_class))
+        if convert is None:
+            raise NotImplementedError('%s scm not supported' % scm_class)
+        scm = []
+        convert(data, scm)
+        yml_parent.append(['scm', scm])
+
+    def compile(self, key):
+        # SCMs are known either by their tag or by their "class" attribute.
+        scm_tag, scm_class = key
+        names = [scm_tag.split('.')[-1].lower()]
+        if scm_class is not None:
+            names.append(scm_class.split('.')[-1].lower())
+        for name in names:
+            if name in self.registry.registry[self.component]:
+                return self.registry.converter(self.component, name)
+        return None
 
 
 def gitscm(top, parent):
@@ -10,8 +10,7 @@ class Triggers(jenkins_job_wrecker.modules.base.Base):
     def gen_yml(self, yml_parent, data):
         triggers = []
         for child in data:
-            object_name = child.tag.split('.')[-1].lower()
-            self.registry.dispatch(self.component, object_name, child, triggers)
+            self.converter(child.tag)(child, triggers)
         yml_parent.append(['triggers', triggers])
 
 
@@ -1,25 +1,155 @@
 # encoding=utf8
 from __future__ import print_function
 
+from functools import partial
+import hashlib
 from importlib import import_module
 from inspect import getmembers, isfunction, isclass
+import json
 from jenkins_job_wrecker.helpers import gen_raw
+import jenkins_job_wrecker
 import jenkins_job_wrecker.modules
+import os
 from os.path import dirname
-from pkg_resources import iter_entry_points
 from pkgutil import iter_modules
+import sys
+import tempfile
+import threading
+try:
+    from importlib.metadata import entry_points, EntryPoint
+except ImportError:  # Python < 3.8
+    entry_points = None
+
+# Entry point groups are named "jenkins_job_wrecker.<component>".
+GROUP_PREFIX = 'jenkins_job_wrecker.'
+
+
+# Marks names that lookup() has not compiled yet.
+MISSING = object()
+
 
 class DuplicateEntryPoint(Exception):
     pass
 
 
+# Our installed entry points by group, read once per process.
+_entry_points = None
+
+
+def scan_entry_points():
+    """
+    Read every installed entry point in one of our groups, without loading
+    them. Returns a dict of group name to a list of entry points.
+    """
+    eps = entry_points()
+    if isinstance(eps, dict):
+        # Python < 3.12 returns a dict of groups. dict.values() avoids the
+        # deprecation warning of its 3.10 and 3.11 wrapper.
+        eps = [ep for group in dict.values(eps) for ep in group]
+    groups = {}
+    for ep in eps:
+        if ep.group.startswith(GROUP_PREFIX):
+            groups.setdefault(ep.group, []).append(ep)
+    return groups
+
+
+def iter_entry_points(group):
+    """
+    Yield the entry points registered for "group" without loading them.
+    """
+    global _entry_points
+    if entry_points is None:
+        from pkg_resources import iter_entry_points as pkg_iter_entry_points
+        return pkg_iter_entry_points(group=group)
+    if _entry_points is None:
+        _entry_points = scan_entry_points()
+    return _entry_points.get(group, ())
+
+
+def distributions_key():
+    """
+    Return a hash of the distributions installed on sys.path. It changes
+    whenever a distribution is installed, upgraded or removed.
+    """
+    found = []
+    for path in sys.path:
+        try:
+            names = os.listdir(path or '.')
+        except OSError:
+            continue
+        for name in names:
+            if name.endswith(('.dist-info', '.egg-info', '.egg-link')):
+                mtime = os.stat(os.path.join(path or '.', name)).st_mtime
+                found.append('%s %s %d' % (path, name, mtime))
+    found.sort()
+    return hashlib.sha1('\n'.join(found).encode('utf-8')).hexdigest()
+
+
+def converter_key(distributions=None):
+    """
+    Return a hash of what converts jobs: the version and the modules of
+    jjwrecker, and the plugins in our entry point groups with the versions
+    of their distributions. It changes whenever any of them does.
+
+    :param distributions: The distributions_key() of a plugin snapshot,
+                          which stands for the plugins without scanning
+                          their entry points.
+    """
+    found = [jenkins_job_wrecker.__version__]
+    pkgpath = dirname(jenkins_job_wrecker.__file__)
+    for dirpath, dirnames, filenames in os.walk(pkgpath):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith('.py'):
+                stat = os.stat(os.path.join(dirpath, name))
+                found.append('%s %d %d' % (os.path.relpath(
+                    os.path.join(dirpath, name), pkgpath), stat.st_size,
+                    stat.st_mtime))
+    if distributions is not None:
+        found.append(distributions)
+    elif entry_points is None:
+        # No versions without importlib.metadata
+        found.append(distributions_key())
+    else:
+        for group, eps in sorted(scan_entry_points().items()):
+            for ep in sorted(eps, key=lambda ep: ep.name):
+                dist = getattr(ep, 'dist', None)  # Python >= 3.10
+                found.append('%s %s %s %s' % (group, ep.name, ep.value,
+                                              dist.version if dist else ''))
+    return hashlib.sha1('\n'.join(found).encode('utf-8')).hexdigest()
+
+
+class Lazy(object):
+    """
+    Placeholder for a handler that is only imported when a job uses it.
+    """
+    __slots__ = ('load',)
+
+    def __init__(self, load):
+        self.load = load
+
+
 class Registry(object):
-    registry = {}
-    project_types = {}
+    """
+    The handlers of every component, and the project types. Each registry
+    has its own tables, filled as jobs use them. A frozen registry is
+    complete and no longer changes, see freeze().
+    """
 
     def __init__(self, ignore_actions=False):
+        self.registry = {}
+        self.project_types = {}
+        # Components whose functions and entry points are already in
+        # "registry".
+        self.registered = set()
         self.__handlers()
         self.ignore_actions = ignore_actions
+        self.instances = {}
+        # (component, name) -> converter function, see lookup().
+        self.converters = {}
+        self.frozen = False
+        # distributions_key() of the plugin snapshot, see load_snapshot().
+        self.snapshot_key = None
 
     def _get_entry_points(self, name):
         found = set()
@@ -28,7 +158,57 @@ class Registry(object):
                 msg = 'Entry point {0} already defined for {1}'.format(ep.name, name)
                 raise DuplicateEntryPoint(msg)
             found.add(ep.name)
-            yield ep.load()
+            yield ep
+
+    def load_snapshot(self, path):
+        """
+        Read plugin entry points and project types from the snapshot file in
+        "path" instead of discovering them. If the snapshot is missing or
+        the installed distributions changed, discover the plugins and write
+        a new snapshot.
+
+        Returns True if the snapshot was used.
+        """
+        global _entry_points
+        if entry_points is None:
+            return False
+        key = self.snapshot_key = distributions_key()
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (IOError, OSError, ValueError):
+            snapshot = {}
+        if snapshot.get('key') == key:
+            _entry_points = {}
+            for group, eps in snapshot['entry_points'].items():
+                _entry_points[group] = [EntryPoint(name, value, group)
+                                        for name, value in eps]
+            self.project_types.update(snapshot['project_types'])
+            return True
+
+        _entry_points = scan_entry_points()
+        snapshot = {
+            'key': key,
+            'entry_points': {group: [[ep.name, ep.value] for ep in eps]
+                             for group, eps in _entry_points.items()},
+            # Loads the project plugins and checks them for duplicates.
+            'project_types': self.get_project_types(),
+        }
+        dirpath = dirname(os.path.abspath(path))
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath)
+        # Write atomically, so concurrent runs never read a partial file.
+        fd, temp = tempfile.mkstemp(dir=dirpath, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.rename(temp, path)
+        return False
+
+    def converter_key(self):
+        """
+        Return converter_key(), from the plugin snapshot if one was loaded.
+        """
+        return converter_key(self.snapshot_key)
 
     def get_project_types(self):
         if len(self.project_types) == 0:
@@ -38,45 +218,157 @@ class Registry(object):
                            'flow-definition': 'pipeline',
                            'com.cloudbees.hudson.plugins.folder.Folder': 'folder',
                            'hudson.model.ListView': 'listview'}
-            for item in self._get_entry_points('jenkins_job_wrecker.projects'):
-                valid_types.update(item)
+            for ep in self._get_entry_points('jenkins_job_wrecker.projects'):
+                valid_types.update(ep.load())
             self.project_types.update(valid_types)
         return self.project_types
 
     def register(self, component):
+        # Components only need to be scanned once per registry.
+        if component in self.registered:
+            return
         mod = import_module('jenkins_job_wrecker.modules.{0}'.format(component))
         if component not in self.registry:
             self.registry[component] = {}
         self.registry[component].update({name: obj
                                          for name, obj in getmembers(mod)
                                          if isfunction(obj)})
-        entry_points = self._get_entry_points('jenkins_job_wrecker.{0}'.format(component))
-        self.registry[component].update(entry_points)
+        # Plugin handlers are only imported once a job contains their tag.
+        group = 'jenkins_job_wrecker.{0}'.format(component)
+        self.registry[component].update((ep.name, Lazy(ep.load))
+                                        for ep in self._get_entry_points(group))
+        self.registered.add(component)
+
+    def preload(self):
+        """
+        Import every component module and plugin handler, and compile their
+        converters, so that no conversion pays for it. Batch conversion
+        warms each worker process with this before its first job.
+        """
+        self.get_project_types()
+        self.register('handlers')
+        done = set()
+        # Compiling a component's handler registers the component itself.
+        while self.registered - done:
+            for component in sorted(self.registered - done):
+                for name in sorted(self.registry[component]):
+                    self.lookup(component, name)
+                done.add(component)
+
+    def freeze(self):
+        """
+        Preload everything, and stop changing the registry afterwards: it
+        no longer records the names it does not know. Threads can then
+        convert with it at the same time.
+        """
+        self.preload()
+        self.frozen = True
 
-    def dispatch(self, component, name, xml, parent):
+    def get_handler(self, cls):
+        """
+        Return the instance of a component handler class (Builders,
+        Publishers, ...) for this registry, creating it on first use.
+        """
         try:
-            my_obj = self.registry[component][name]
-            if isfunction(my_obj):
-                self.registry[component][name](xml, parent)
-                return
-            if isclass(my_obj):
-                handler = my_obj(self)
-                handler.gen_yml(parent, xml)
-                return
+            return self.instances[cls]
+        except KeyError:
+            handler = self.instances[cls] = cls(self)
+            return handler
+
+    def lookup(self, component, name):
+        """
+        Return the function converting the "name" element of "component",
+        or None if nothing is registered for it. The answer is compiled into
+        a table the first time each name is seen.
+        """
+        key = (component, name)
+        convert = self.converters.get(key, MISSING)
+        if self.frozen:
+            # preload() compiled every name there is.
+            return None if convert is MISSING else convert
+        if convert is MISSING:
+            convert = self.converters[key] = self.__compile(component, name)
+        return convert
+
+    def converter(self, component, name):
+        """
+        Like lookup(), but the returned function falls back to raw XML for
+        unknown names and for handlers that cannot convert an element.
+        """
+        convert = self.lookup(component, name)
+        if convert is None:
+            return gen_raw
+
+        def convert_or_raw(xml, parent):
+            try:
+                convert(xml, parent)
+            except (KeyError, NotImplementedError):
+                gen_raw(xml, parent)
+        return convert_or_raw
+
+    def dispatch(self, component, name, xml, parent, ignore_actions=None):
+        if ignore_actions is None:
+            ignore_actions = self.ignore_actions
+        try:
+            convert = self.lookup(component, name)
+            if convert is None:
+                raise KeyError(name)
+            convert(xml, parent)
         except (KeyError, NotImplementedError) as e:
-            if self.ignore_actions and name == 'actions':
-                print('WARNING: {0} Ignoring because of -a...'.format(e))
+            if ignore_actions and name == 'actions':
+                print('WARNING: {0} Ignoring because of -a...'.format(e),
+                      file=sys.stderr)
                 return
             elif component == 'handlers':
                 raise
             gen_raw(xml, parent)
 
+    def __compile(self, component, name):
+        my_obj = self.registry.get(component, {}).get(name)
+        if isinstance(my_obj, Lazy):
+            my_obj = self.registry[component][name] = my_obj.load()
+        if isfunction(my_obj):
+            return my_obj
+        if isclass(my_obj):
+            handler = self.get_handler(my_obj)
+            return lambda xml, parent: handler.gen_yml(parent, xml)
+        return None
+
     def __handlers(self):
+        # Component modules are only imported once a job contains their
+        # top-level tag.
         self.registry['handlers'] = {}
         pkgpath = dirname(jenkins_job_wrecker.modules.__file__)
         for name in [name
                      for _, name, _ in iter_modules([pkgpath])
                      if name not in ['handlers', 'base']]:
-            my_mod = import_module('jenkins_job_wrecker.modules.%s' % name)
-            my_obj = getattr(my_mod, name.capitalize())
-            self.registry['handlers'].update({name: my_obj})
+            self.registry['handlers'][name] = Lazy(partial(load_handler, name))
+
+
+def load_handler(name):
+    """
+    Import a component module and return its handler class, for example
+    Scm from jenkins_job_wrecker.modules.scm.
+    """
+    my_mod = import_module('jenkins_job_wrecker.modules.%s' % name)
+    return getattr(my_mod, name.capitalize())
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Return the process-wide Registry, building it on first use.
+
+    The registry and the component handlers it caches are shared by every
+    conversion in the process. Per-conversion options such as
+    "ignore_actions" are passed to dispatch() instead.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = Registry()
+    return _registry
@@ -0,0 +1,211 @@
+# encoding=utf8
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+try:
+    from urllib.parse import quote
+except ImportError:  # Python 2
+    from urllib import quote
+
+# Folder levels listed per request by get_inventory().
+INVENTORY_DEPTH = 10
+
+# Fields of each job in the inventory. lastBuild hints at recent changes.
+INVENTORY_FIELDS = 'name,fullName,_class,lastBuild[number,timestamp]'
+
+
+def job_url(fullname):
+    """ Return the URL path of a job, which may be in folders. """
+    return ''.join('job/%s/' % quote(part, safe='')
+                   for part in fullname.split('/'))
+
+
+def view_url(fullname):
+    """ Return the URL path of a view, which may be in folders. """
+    folder, _, name = fullname.rpartition('/')
+    path = job_url(folder) if folder else ''
+    return path + 'view/%s/' % quote(name, safe='')
+
+
+def inventory_tree(depth=INVENTORY_DEPTH):
+    """
+    Return the "tree" query listing jobs and the jobs in their folders,
+    "depth" levels deep: jobs[...,jobs[...,jobs[...,jobs]]]
+    """
+    # The innermost "jobs" shows which folders go deeper than this query.
+    tree = 'jobs[%s,jobs]' % INVENTORY_FIELDS
+    for _ in range(depth - 1):
+        tree = 'jobs[%s,%s]' % (INVENTORY_FIELDS, tree)
+    return tree
+
+
+def parse_inventory(data):
+    """
+    Flatten the JSON data of an inventory_tree() query.
+
+    Returns the list of jobs and folders, as dicts with the "name",
+    "fullname", "_class" and "lastBuild" keys, and the full names of the
+    folders that are too deep for this query and must be listed again.
+    """
+    jobs = []
+    folders = []
+
+    def walk(items):
+        for item in items:
+            jobs.append({'name': item['name'],
+                         'fullname': item['fullName'],
+                         '_class': item.get('_class'),
+                         'lastBuild': item.get('lastBuild')})
+            children = item.get('jobs')
+            if not children:
+                continue
+            # Jenkins returns empty items past the depth of the query.
+            if any('fullName' not in child for child in children):
+                folders.append(item['fullName'])
+            else:
+                walk(children)
+    walk(data.get('jobs', []))
+    return jobs, folders
+
+
+def get_tree(server, path, tree):
+    """
+    Return the JSON API data of "path" on a jenkins.Jenkins server, for a
+    "tree" query.
+    """
+    import requests
+    url = server.server + path + 'api/json'
+    request = requests.Request('GET', url, params={'tree': tree})
+    return json.loads(server.jenkins_open(request))
+
+
+def get_inventory(server, depth=INVENTORY_DEPTH):
+    """
+    List every job, folder and view of a jenkins.Jenkins server.
+
+    One request lists the views and "depth" levels of folders. Only deeper
+    folders need requests of their own.
+
+    Returns (jobs, views). Jobs are described in parse_inventory(), views
+    are dicts with a "name" key like in jenkins.Jenkins.get_views().
+    """
+    tree = inventory_tree(depth)
+    data = get_tree(server, '', 'views[name],' + tree)
+    views = [{'name': view['name']} for view in data.get('views', [])]
+    jobs, folders = parse_inventory(data)
+    while folders:
+        data = get_tree(server, job_url(folders.pop(0)), tree)
+        more_jobs, more_folders = parse_inventory(data)
+        jobs.extend(more_jobs)
+        folders.extend(more_folders)
+    return jobs, views
+
+
+class ConfigFetcher(object):
+    """
+    Fetch the config.xml of jobs and views from a Jenkins server.
+
+    python-jenkins sessions are not safe to share between threads, so every
+    thread that calls fetch() gets its own jenkins.Jenkins connection.
+
+    With a cache.ConfigCache, configs are requested with the validators of
+    the cached copy, and the server only sends the ones that changed.
+    """
+
+    def __init__(self, url, username=None, password=None, cache=None):
+        self.url = url
+        self.username = username
+        self.password = password
+        self.cache = cache
+        self.local = threading.local()
+
+    @property
+    def server(self):
+        """ The jenkins.Jenkins connection of the calling thread. """
+        server = getattr(self.local, 'server', None)
+        if server is None:
+            # python-jenkins is slow to import, so only pay for it in
+            # server mode.
+            import jenkins
+            server = jenkins.Jenkins(self.url,
+                                     username=self.username,
+                                     password=self.password)
+            self.local.server = server
+        return server
+
+    def inventory(self):
+        """ List every job, folder and view, see get_inventory(). """
+        return get_inventory(self.server)
+
+    def fetch(self, element_type, fullname):
+        """
+        Return the XML of a job or view.
+
+        :param str element_type: Either 'job' or 'view'.
+        :param str fullname: The full name of the job or view.
+        """
+        if element_type == 'job':
+            if self.cache is None:
+                return self.server.get_job_config(fullname)
+            return self.fetch_cached(job_url(fullname) + 'config.xml')
+        if element_type == 'view':
+            if self.cache is None:
+                return self.server.get_view_config(fullname)
+            return self.fetch_cached(view_url(fullname) + 'config.xml')
+        raise ValueError('Invalid element_type %s' % element_type)
+
+    def fetch_cached(self, path):
+        """
+        Return the body of "path", revalidating the cached copy if there
+        is one.
+        """
+        import requests
+        server = self.server
+        url = server.server + path
+        validators, xml = self.cache.get_config(url)
+        headers = {}
+        if validators:
+            if 'ETag' in validators:
+                headers['If-None-Match'] = validators['ETag']
+            if 'Last-Modified' in validators:
+                headers['If-Modified-Since'] = validators['Last-Modified']
+        request = requests.Request('GET', url, headers=headers)
+        response = server.jenkins_request(request)
+        if response.status_code == 304 and xml is not None:
+            return xml
+        validators = dict((header, response.headers[header])
+                          for header in ('ETag', 'Last-Modified')
+                          if header in response.headers)
+        # Without validators, the cached copy could never be reused.
+        if validators:
+            self.cache.set_config(url, validators, response.text)
+        return response.text
+
+
+def ordered_map(func, items, workers=1):
+    """
+    Like map(), but call "func" on up to "workers" threads at once.
+
+    Results are yielded in the order of "items", each one as soon as it and
+    the ones before it are ready. At most 2 * workers calls are in flight,
+    so a slow consumer does not make results pile up in memory.
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+    executor = ThreadPoolExecutor(workers)
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Do not start the remaining calls if the consumer stopped early.
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
@@ -0,0 +1,156 @@
+# encoding=utf8
+import os
+import tarfile
+import xml.etree.ElementTree as ET
+import zipfile
+try:
+    from os import scandir
+except ImportError:  # Python 2
+    scandir = None
+
+
+def subdirectories(path):
+    """
+    Return the sorted names of the directories in "path". Raises OSError
+    if it cannot be listed.
+    """
+    if scandir is None:
+        return sorted(name for name in os.listdir(path)
+                      if os.path.isdir(os.path.join(path, name)))
+    # Most file systems tell scandir() the type of each entry, without a
+    # stat() call.
+    return sorted(entry.name for entry in scandir(path) if entry.is_dir())
+
+
+def jenkins_home_jobs(jobs_dir, folder=None):
+    """
+    Yield (fullname, filename) of the config.xml of each job under the
+    "jobs" directory of a JENKINS_HOME, and of the jobs in its folders.
+    """
+    try:
+        names = subdirectories(jobs_dir)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(jobs_dir, name)
+        filename = os.path.join(path, 'config.xml')
+        if not os.path.isfile(filename):
+            continue
+        fullname = folder + '/' + name if folder else name
+        yield fullname, filename
+        # Folders keep their jobs in a "jobs" directory of their own.
+        for job in jenkins_home_jobs(os.path.join(path, 'jobs'), fullname):
+            yield job
+
+
+def jenkins_home_views(home):
+    """
+    Yield (name, xml) of each view in the config.xml of a JENKINS_HOME,
+    except "all". The XML is the same as the server's view config.xml.
+    """
+    filename = os.path.join(home, 'config.xml')
+    if not os.path.isfile(filename):
+        return
+    for view in config_views(ET.parse(filename).getroot()):
+        yield view
+
+
+def config_views(root):
+    """
+    Yield (name, xml) of each view in the parsed top-level config.xml of a
+    JENKINS_HOME, except "all".
+    """
+    views = root.find('views')
+    if views is None:
+        return
+    for view in views:
+        name = view.findtext('name')
+        if name is None or name == 'all':
+            continue
+        # Only the global config links views back to their owner.
+        owner = view.find('owner')
+        if owner is not None:
+            view.remove(owner)
+        view.tail = None
+        yield name, ET.tostring(view, encoding='utf-8')
+
+
+def archive_job_name(member):
+    """
+    Return the full name of the job whose config.xml is the archive member
+    "member", like "folder/job" for ".../jobs/folder/jobs/job/config.xml",
+    or None if it is not a job's config.xml.
+    """
+    parts = [part for part in member.split('/') if part not in ('', '.')]
+    if len(parts) < 3 or parts[-1] != 'config.xml':
+        return None
+    names = []
+    i = len(parts) - 2
+    while i >= 1 and parts[i - 1] == 'jobs':
+        names.insert(0, parts[i])
+        i -= 2
+    if not names:
+        return None
+    return '/'.join(names)
+
+
+# Directories of a JENKINS_HOME that hold config.xml files of their own
+JENKINS_HOME_DIRS = frozenset(['jobs', 'users', 'nodes', 'workspace',
+                               'plugins', 'secrets', 'fingerprints',
+                               'userContent', 'war'])
+
+
+def archive_global_config(member):
+    """
+    Return True if the archive member "member" may be the top-level
+    config.xml of the JENKINS_HOME: a config.xml that is not in one of its
+    directories, like "jenkins/config.xml".
+    """
+    parts = [part for part in member.split('/') if part not in ('', '.')]
+    return bool(parts) and parts[-1] == 'config.xml' and \
+        JENKINS_HOME_DIRS.isdisjoint(parts[:-1])
+
+
+def archive_members(fileobj):
+    """
+    Yield (name, data) of each config.xml in a tar (optionally compressed)
+    or zip archive, reading it as a stream, one member at a time. Only tar
+    archives can be read from an unseekable stream like a pipe.
+    """
+    seekable = fileobj.seekable()
+    if seekable and zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.filename.endswith('config.xml'):
+                    yield info.filename, archive.read(info)
+        return
+    if seekable:
+        fileobj.seek(0)
+    # "r|*" reads the archive sequentially and never seeks back.
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile() and member.name.endswith('config.xml'):
+                yield member.name, archive.extractfile(member).read()
+
+
+def archive_configs(fileobj):
+    """
+    Yield (element_type, fullname, xml) for the jobs and views in a backup
+    archive of a JENKINS_HOME, in the order they are stored. Nothing is
+    extracted to disk, and only one config.xml is in memory at a time.
+    """
+    for name, data in archive_members(fileobj):
+        fullname = archive_job_name(name)
+        if fullname is not None:
+            yield 'job', fullname, data
+            continue
+        # Only the top-level config.xml has views. The others belong to
+        # users, nodes, matrix configurations... and Jenkins writes XML 1.1
+        # there, that ElementTree may not parse.
+        if not archive_global_config(name):
+            continue
+        root = ET.fromstring(data)
+        if root.tag == 'hudson':
+            for view_name, xml in config_views(root):
+                yield 'view', view_name, xml
@@ -0,0 +1,373 @@
+# encoding=utf8
+"""
+Turn groups of jobs that only differ in a few values, like their repository
+URL, branch or node label, into JJB job templates with a project listing
+those values for each job.
+
+Candidate groups come from MinHash signatures of the settings of each job
+and locality-sensitive hashing, so jobs are only compared to the few others
+that share a bucket with them, and never pairwise across the whole fleet.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+from itertools import islice
+from operator import ne
+import re
+
+from jenkins_job_wrecker.cli import string_types
+from jenkins_job_wrecker.memo import copy_data
+
+# Folder of the output directory holding one file per template. "@" cannot
+# appear in a Jenkins job name, so no job is written there.
+TEMPLATES_DIR = '@templates'
+
+# Number of values in a MinHash signature, split into BANDS bands. Two jobs
+# are compared when all the values of one band are equal: with 8 bands of 8
+# values, jobs with 90% of their settings in common almost always are, and
+# jobs with a third in common almost never.
+SIGNATURE_SIZE = 64
+BANDS = 8
+
+# Most values that may differ between the jobs of a template, or one in
+# PARAMETER_SHARE of the values of larger jobs.
+MAX_PARAMETERS = 8
+PARAMETER_SHARE = 10
+
+# Most jobs of its buckets that a job is compared to, before it knows which
+# of its values are parameters.
+MAX_CANDIDATES = 256
+
+# What a template string holding only a parameter looks like. JJB puts the
+# value itself there, of any type.
+PARAMETER = re.compile(r'\{(\w+)\}\Z')
+
+UNSAFE_CHARACTERS = re.compile(r'[^A-Za-z0-9_]+')
+
+
+def escape(value):
+    """
+    Double the braces of a string, which JJB would otherwise take for
+    parameters in a template or in the values of a project.
+    """
+    if isinstance(value, string_types):
+        return value.replace('{', '{{').replace('}', '}}')
+    return value
+
+
+def unescape(value):
+    """ Undo escape(). """
+    if isinstance(value, string_types):
+        return value.replace('{{', '{').replace('}}', '}')
+    return value
+
+
+def flatten(data, path=(), leaves=None):
+    """
+    Return the (path, value) pairs of the values of "data", nested lists
+    and dicts, with their paths as tuples of keys and indices, in the order
+    of the keys. Empty lists and dicts are values too.
+    """
+    if leaves is None:
+        leaves = []
+    if isinstance(data, dict) and data:
+        # Sorted: dicts are not ordered before Python 3.6.
+        for key, value in sorted(data.items()):
+            flatten(value, path + (key,), leaves)
+    elif isinstance(data, list) and data:
+        for i, value in enumerate(data):
+            flatten(value, path + (i,), leaves)
+    else:
+        leaves.append((path, data))
+    return leaves
+
+
+def same(value1, value2):
+    """ Return True if two values are equal, and of the same type. """
+    return type(value1) is type(value2) and value1 == value2
+
+
+class Template(object):
+    """
+    A group of jobs turned into a template. "parameters" maps the paths of
+    the values that differ between the jobs to the names of the parameters
+    standing for them.
+    """
+
+    def __init__(self, names, jobs, parameters):
+        self.names = names
+        self.jobs = jobs
+        self.parameters = parameters
+        self.body = self.build(jobs[0], ())
+        self.id = None
+
+    def build(self, data, path):
+        if path in self.parameters:
+            return '{%s}' % self.parameters[path]
+        if isinstance(data, dict):
+            return dict((escape(key), self.build(value, path + (key,)))
+                        for key, value in data.items())
+        if isinstance(data, list):
+            return [self.build(value, path + (i,))
+                    for i, value in enumerate(data)]
+        return escape(data)
+
+    def digest(self):
+        canonical = json.dumps(self.body, sort_keys=True, default=repr)
+        return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+    def definitions(self):
+        """ Return the template and its project, in JJB's format. """
+        template = dict(self.body, id=self.id)
+        jobs = []
+        for _, job in sorted(zip(self.names, self.jobs),
+                             key=lambda item: item[0]):
+            leaves = dict(flatten(job))
+            values = dict((name, escape(copy_data(leaves[path])))
+                          for path, name in self.parameters.items())
+            jobs.append({self.id: values})
+        return [{'job-template': template},
+                {'project': {'name': self.id, 'jobs': jobs}}]
+
+
+class TemplateIndex(object):
+    """
+    Finds the groups of at least "min_count" jobs, given with add(), whose
+    settings have the same structure and differ in at most "max_parameters"
+    values, see templates().
+    """
+
+    def __init__(self, min_count=2, max_parameters=MAX_PARAMETERS):
+        self.min_count = min_count
+        self.max_parameters = max_parameters
+        # name -> (job, paths of its values, its values)
+        self.jobs = {}
+        # (band, values of the signature) -> names of the jobs, as the keys
+        # of an OrderedDict: ordered, and quick to remove.
+        self.buckets = {}
+        # name -> LSH buckets the job is in, until it is in a template
+        self.job_buckets = {}
+        # Paths of the values of the jobs, shared by the jobs with the same
+        # structure.
+        self.structures = {}
+        # Hashes of the (path, value) pairs seen so far: most of them are
+        # shared by many jobs.
+        self.hashes = {}
+
+    def add(self, name, job):
+        """ Index a job, a dict of its settings. """
+        if not isinstance(job.get('name'), string_types):
+            return
+        leaves = [(path, value) for path, value in flatten(job)
+                  if path != ('name',)]
+        if not leaves:
+            return
+        paths = tuple(path for path, _ in leaves)
+        paths = self.structures.setdefault(paths, paths)
+        values = tuple(value for _, value in leaves)
+        self.jobs[name] = (job, paths, values)
+        buckets = self.job_buckets[name] = []
+        signature = self.signature(leaves)
+        rows = SIGNATURE_SIZE // BANDS
+        for band in range(BANDS):
+            key = (band, tuple(signature[band * rows:(band + 1) * rows]))
+            self.buckets.setdefault(key, OrderedDict())[name] = None
+            buckets.append(key)
+
+    def signature(self, leaves):
+        """
+        Return the one-permutation MinHash signature of the (path, value)
+        pairs of a job: each pair is hashed once, the hash picks a value of
+        the signature, and that value is the least of those it picked.
+        Values that no pair picked are borrowed from the next one that was,
+        so that small jobs do not all look alike.
+        """
+        signature = [None] * SIGNATURE_SIZE
+        hashes = self.hashes
+        for leaf in leaves:
+            shingle = repr(leaf)
+            h = hashes.get(shingle)
+            if h is None:
+                digest = hashlib.sha1(shingle.encode('utf-8')).hexdigest()
+                h = hashes[shingle] = int(digest[:16], 16)
+            i = h % SIGNATURE_SIZE
+            value = h // SIGNATURE_SIZE
+            if signature[i] is None or value < signature[i]:
+                signature[i] = value
+        # Hashes are 64 bits, values at most 58: add the distance above.
+        for i in range(SIGNATURE_SIZE):
+            distance = 1
+            while signature[i] is None:
+                value = signature[(i + distance) % SIGNATURE_SIZE]
+                if value is not None and value < 1 << 58:
+                    signature[i] = value + (distance << 58)
+                distance += 1
+        return signature
+
+    def candidates(self, name):
+        """
+        Yield the jobs with the same structure as job "name" that share an
+        LSH bucket with it, and are not in a template yet.
+        """
+        paths = self.jobs[name][1]
+        seen = set([name])
+        for key in self.job_buckets[name]:
+            for other in self.buckets[key]:
+                if other not in seen:
+                    seen.add(other)
+                    if self.jobs[other][1] is paths:
+                        yield other
+
+    def differences(self, values, other, limit):
+        """
+        Return the indices of the values of job "other" that differ from
+        "values", or None if there are more than "limit".
+        """
+        other_values = self.jobs[other][2]
+        # Values of different types can be equal, like 1 and True: this
+        # only counts the differences that surely are, quickly.
+        if sum(map(ne, values, other_values)) > limit:
+            return None
+        different = frozenset(i for i, value in enumerate(values)
+                              if not same(value, other_values[i]))
+        return different if len(different) <= limit else None
+
+    def group(self, name):
+        """
+        Return the names of the jobs that can share a template with job
+        "name", and the indices of the values that differ between them.
+
+        The closest of the first MAX_CANDIDATES candidates join first,
+        while the group stays under the limit of parameters. Then the
+        other candidates join if they only differ in the same values.
+        """
+        values = self.jobs[name][2]
+        limit = max(self.max_parameters, len(values) // PARAMETER_SHARE)
+        candidates = self.candidates(name)
+        closest = []
+        for other in islice(candidates, MAX_CANDIDATES):
+            different = self.differences(values, other, limit)
+            if different is not None:
+                closest.append((len(different), other, different))
+        closest.sort(key=lambda item: (item[0], item[1]))
+        names = [name]
+        varying = set()
+        for _, other, different in closest:
+            if len(varying | different) <= limit:
+                varying |= different
+                names.append(other)
+        if len(names) < self.min_count:
+            return names, varying
+        for other in candidates:
+            different = self.differences(values, other, len(varying))
+            if different is not None and different <= varying:
+                names.append(other)
+        return names, varying
+
+    def templates(self):
+        """
+        Return the groups of jobs as Templates, each job in at most one.
+        A job starts a group with the closest jobs in its buckets that
+        keep the group under "max_parameters" differences, or one in
+        PARAMETER_SHARE of its values.
+        """
+        # digest of the body -> template
+        templates = {}
+        for name in sorted(self.jobs):
+            if name not in self.job_buckets:
+                continue
+            names, varying = self.group(name)
+            if len(names) < self.min_count:
+                continue
+            for other in names:
+                for key in self.job_buckets.pop(other):
+                    del self.buckets[key][other]
+            paths = self.jobs[name][1]
+            parameters = parameter_names([paths[i] for i in sorted(varying)])
+            parameters[('name',)] = 'name'
+            template = Template(names, [self.jobs[n][0] for n in names],
+                                parameters)
+            digest = template.digest()
+            if digest in templates:
+                # Jobs that LSH did not bring together
+                templates[digest].names.extend(template.names)
+                templates[digest].jobs.extend(template.jobs)
+            else:
+                templates[digest] = template
+        taken = set()
+        for digest, template in sorted(templates.items()):
+            length = 8
+            while digest[:length] in taken:
+                length += 1
+            taken.add(digest[:length])
+            template.id = 'template-' + digest[:length]
+        return sorted(templates.values(), key=lambda template: template.id)
+
+
+def parameter_names(paths):
+    """
+    Name a parameter after each path, like "url" for ('scm', 0, 'git',
+    'url'): its last key, with the keys before it when that is taken.
+    """
+    names = {}
+    taken = set(['name', 'id'])
+    for path in paths:
+        keys = [UNSAFE_CHARACTERS.sub('_', key).strip('_').lower()
+                for key in path if isinstance(key, string_types)]
+        keys = [key for key in keys if key] or ['value']
+        for count in range(1, len(keys) + 1):
+            name = '_'.join(keys[-count:])
+            if name not in taken:
+                break
+        suffix = 2
+        base = name
+        while name in taken:
+            name = '%s_%d' % (base, suffix)
+            suffix += 1
+        taken.add(name)
+        names[path] = name
+    return names
+
+
+def substitute(data, parameters):
+    """
+    Return the settings of a template with the values of "parameters"
+    in place of theirs, and without escaped braces.
+    """
+    if isinstance(data, dict):
+        return dict((unescape(key), substitute(value, parameters))
+                    for key, value in data.items())
+    if isinstance(data, list):
+        return [substitute(value, parameters) for value in data]
+    if isinstance(data, string_types):
+        match = PARAMETER.match(data)
+        if match and match.group(1) in parameters:
+            return unescape(copy_data(parameters[match.group(1)]))
+    return unescape(data)
+
+
+def expand_templates(documents):
+    """
+    Return the settings of the jobs that the projects of a list of JJB
+    definitions make of its job templates. Only the templates written by
+    Template.definitions() are supported.
+    """
+    templates = {}
+    for definition in documents or ():
+        if isinstance(definition, dict) and \
+                isinstance(definition.get('job-template'), dict):
+            template = dict(definition['job-template'])
+            templates[template.pop('id', None)] = template
+    jobs = []
+    for definition in documents or ():
+        if not isinstance(definition, dict) or \
+                not isinstance(definition.get('project'), dict):
+            continue
+        for entry in definition['project'].get('jobs') or ():
+            if not isinstance(entry, dict):
+                continue
+            for template_id, parameters in entry.items():
+                if template_id in templates:
+                    jobs.append(substitute(templates[template_id],
+                                           parameters or {}))
+    return jobs
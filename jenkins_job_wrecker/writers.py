@@ -0,0 +1,223 @@
+# encoding=utf8
+"""
+Write converted jobs and views to YAML files.
+"""
+from contextlib import contextmanager
+import errno
+import itertools
+import os
+import sys
+import threading
+
+# os.rename() cannot replace files on Windows
+replace = getattr(os, 'replace', os.rename)
+
+# Buffer size of the output files, the emitter writes many small strings.
+BUFFER_SIZE = 256 * 1024
+
+
+def same_contents(path1, path2):
+    """
+    Return True if the files "path1" and "path2" exist and hold the same
+    bytes. Files of different sizes are told apart without reading them.
+    """
+    try:
+        if os.path.getsize(path1) != os.path.getsize(path2):
+            return False
+        with open(path1, 'rb') as f1, open(path2, 'rb') as f2:
+            while True:
+                data = f1.read(BUFFER_SIZE)
+                if data != f2.read(BUFFER_SIZE):
+                    return False
+                if not data:
+                    return True
+    except OSError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+        return False
+
+
+class DocumentStream(object):
+    """
+    Passes the YAML of a job or view on to a "stream" of several, without
+    the document end marker ("...") that the emitter writes after a "|+"
+    block at the very end: the next job would start a new document, that
+    jenkins-jobs does not read. The block keeps its trailing blank lines
+    without it, as the next job is less indented.
+    """
+    END = '\n...\n'
+
+    def __init__(self, stream):
+        self.stream = stream
+        # libyaml writes bytes to streams without an encoding.
+        self.encoding = getattr(stream, 'encoding', None)
+        # The end of the text so far, that could be the marker
+        self.tail = ''
+
+    def write(self, data):
+        data = self.tail + data
+        self.tail = data[-len(self.END):]
+        self.stream.write(data[:-len(self.END)])
+
+    def flush(self):
+        self.stream.flush()
+
+    def finish(self):
+        """ Write the end of the text, without a final marker. """
+        if self.tail.endswith(self.END):
+            self.tail = self.tail[:-len(self.END) + 1]
+        self.stream.write(self.tail)
+        self.tail = ''
+
+
+class OutputWriter(object):
+    """
+    Writes YAML files under output_dir. Each file is written to a temporary
+    file next to it, and renamed over it once complete, so an interrupted
+    run never leaves a truncated file behind.
+
+    A file whose contents did not change is left untouched, with its mtime,
+    so that tools watching the output only see the jobs that changed.
+    "stats" counts the files "written" and "unchanged", and the "new" ones
+    among those written.
+    """
+
+    def __init__(self, output_dir, buffer_size=BUFFER_SIZE):
+        self.output_dir = output_dir
+        self.buffer_size = buffer_size
+        # Folders that already exist
+        self.directories = set()
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        self.stats = {'written': 0, 'unchanged': 0, 'new': 0}
+
+    def filename(self, name):
+        """ Return the file name for the job or view "name". """
+        return os.path.join(self.output_dir, name + '.yml')
+
+    def makedirs(self, path):
+        """ Create the folder "path" unless it was already created. """
+        if path in self.directories:
+            return
+        try:
+            os.makedirs(path)
+        except OSError as exc:  # Python >2.5
+            if exc.errno != errno.EEXIST or not os.path.isdir(path):
+                raise
+        with self.lock:
+            self.directories.add(path)
+
+    @contextmanager
+    def open(self, name):
+        """
+        Open the YAML file of job or view "name" for writing, as a buffered
+        text file. It only replaces the previous file when the "with" block
+        completes without an exception.
+        """
+        filename = self.filename(name)
+        self.makedirs(os.path.dirname(filename))
+        temp = '%s.%d.%d.tmp' % (filename, os.getpid(), next(self.counter))
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with os.fdopen(fd, 'w', self.buffer_size) as f:
+                yield f
+        except BaseException:
+            os.unlink(temp)
+            raise
+        self.finish(temp, filename)
+
+    def finish(self, temp, filename):
+        """
+        Replace "filename" with the complete temporary file "temp", unless
+        both are identical, and count the outcome in "stats".
+        """
+        if same_contents(temp, filename):
+            os.unlink(temp)
+            outcome = ['unchanged']
+        else:
+            outcome = ['written']
+            if not os.path.exists(filename):
+                outcome.append('new')
+            replace(temp, filename)
+        with self.lock:
+            for key in outcome:
+                self.stats[key] += 1
+
+    def summary(self):
+        """ Describe "stats" in one line. """
+        return ('%(written)d files written (%(new)d new), '
+                '%(unchanged)d unchanged' % self.stats)
+
+    def write(self, name, yaml):
+        """
+        Write the YAML of job or view "name", and return the file name.
+        """
+        with self.open(name) as f:
+            f.write(yaml)
+        return self.filename(name)
+
+    def close(self, complete=True):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(exc_type is None)
+
+
+class StreamWriter(OutputWriter):
+    """
+    Writes every job and view to a single YAML stream, a file or stdout
+    ("-"), as soon as each one is converted. Together they make one list of
+    jobs and views, as jenkins-jobs expects in a file.
+
+    A file is written to a temporary file next to it, which only replaces
+    the previous file once closed after a complete run.
+    """
+
+    def __init__(self, filename, buffer_size=BUFFER_SIZE):
+        super(StreamWriter, self).__init__(os.path.dirname(filename),
+                                           buffer_size)
+        self.path = filename
+        self.temp = None
+        if filename == '-':
+            self.stream = sys.stdout
+            return
+        if self.output_dir:
+            self.makedirs(self.output_dir)
+        self.temp = '%s.%d.tmp' % (filename, os.getpid())
+        fd = os.open(self.temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        self.stream = os.fdopen(fd, 'w', buffer_size)
+
+    def filename(self, name):
+        return self.path
+
+    @contextmanager
+    def open(self, name):
+        """
+        Return the stream, to append the YAML of job or view "name" to it.
+        """
+        stream = DocumentStream(self.stream)
+        yield stream
+        stream.finish()
+        if self.temp is None:
+            # Let whoever reads stdout start with this job.
+            self.stream.flush()
+
+    def close(self, complete=True):
+        """
+        Finish the stream. A file only replaces the previous one if
+        "complete" is True, otherwise it is removed.
+        """
+        if self.stream is None:
+            return
+        if self.temp is None:
+            self.stream.flush()
+        else:
+            self.stream.close()
+            if complete:
+                self.finish(self.temp, self.path)
+            else:
+                os.unlink(self.temp)
+        self.stream = None
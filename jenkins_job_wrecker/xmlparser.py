@@ -0,0 +1,200 @@
+# encoding=utf8
+"""
+XML parser backends for job and view configs.
+
+xml.etree.ElementTree is used unless lxml is chosen with set_backend(). The
+handler modules work the same with the elements of either, but the
+ElementTree functions only accept ElementTree elements: use tostring() from
+here instead.
+"""
+from contextlib import contextmanager
+import threading
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+BACKENDS = ['etree', 'lxml']
+
+# lxml is opt-in: plugin handlers may call ElementTree functions on the
+# elements they get, which only accept ElementTree elements.
+_backend = 'etree'
+_options = {'huge_tree': True, 'recover': False}
+_local = threading.local()
+
+
+def set_backend(name, huge_tree=True, recover=False):
+    """
+    Choose the parser backend, "etree" or "lxml". The options only apply to
+    lxml: "huge_tree" lifts libxml2's limits on the depth of the tree and
+    the size of text nodes, like giant inline Groovy scripts, and "recover"
+    parses as much of a broken document as possible instead of failing.
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError('unknown XML parser %s' % name)
+    if name == 'lxml' and etree is None:
+        raise ValueError('lxml is not installed')
+    _backend = name
+    _options['huge_tree'] = huge_tree
+    _options['recover'] = recover
+    _local.__dict__.clear()
+
+
+def get_backend():
+    """ Return the name of the parser backend in use. """
+    return _backend
+
+
+def get_options():
+    """ Return the options of set_backend() in use, as a dict. """
+    return dict(_options)
+
+
+def _lxml_options():
+    # Like ElementTree: no comments, no processing instructions and no
+    # external entities.
+    return dict(huge_tree=_options['huge_tree'],
+                recover=_options['recover'],
+                remove_comments=True,
+                remove_pis=True,
+                resolve_entities=False,
+                no_network=True)
+
+
+def _lxml_parser(encoding=None):
+    # lxml parsers must not be shared between threads.
+    parsers = _local.__dict__.setdefault('parsers', {})
+    parser = parsers.get(encoding)
+    if parser is None:
+        parser = parsers[encoding] = etree.XMLParser(encoding=encoding,
+                                                     **_lxml_options())
+    return parser
+
+
+@contextmanager
+def _parse_errors():
+    """ Raise the syntax errors of lxml as ElementTree.ParseError. """
+    try:
+        yield
+    except etree.XMLSyntaxError as e:
+        error = ET.ParseError(str(e))
+        error.position = e.position
+        raise error
+
+
+def parse(filename=None, string=None):
+    """
+    Parse an XML file or string with the current backend and return the
+    root element. Raises xml.etree.ElementTree.ParseError on bad XML with
+    either backend.
+    """
+    if _backend == 'etree':
+        if filename:
+            return ET.parse(filename).getroot()
+        return ET.fromstring(string)
+
+    with _parse_errors():
+        if filename:
+            root = etree.parse(filename, _lxml_parser()).getroot()
+        elif isinstance(string, bytes):
+            root = etree.fromstring(string, _lxml_parser())
+        else:
+            # lxml refuses text with an encoding declaration.
+            root = etree.fromstring(string.encode('utf-8'),
+                                    _lxml_parser('utf-8'))
+    if root is None:
+        # What "recover" makes of a document without any element.
+        raise ET.ParseError('no element found')
+    return root
+
+
+class PullParser(object):
+    """
+    Non-blocking parser of the current backend: feed() it chunks of XML as
+    they arrive, and read_events() returns the ("start" or "end", element)
+    events of what was parsed so far. Raises ElementTree.ParseError on bad
+    XML with either backend.
+
+    An lxml parser must be fed from a single thread. Use the "etree"
+    backend to feed chunks from whichever thread is free.
+
+    Python 2's ElementTree has no XMLPullParser: the "etree" backend then
+    keeps the chunks, only parses the whole document in close(), and
+    returns its root element from there instead of any events.
+    """
+
+    def __init__(self, backend=None):
+        events = ('start', 'end')
+        self.lxml = (backend or _backend) == 'lxml'
+        self.chunks = None
+        if self.lxml:
+            self._parser = etree.XMLPullParser(events, **_lxml_options())
+        elif hasattr(ET, 'XMLPullParser'):
+            self._parser = ET.XMLPullParser(events)
+        else:  # Python 2
+            self._parser = None
+            self.chunks = []
+
+    def feed(self, data):
+        if self.chunks is not None:
+            return self.chunks.append(data)
+        if not self.lxml:
+            return self._parser.feed(data)
+        with _parse_errors():
+            self._parser.feed(data)
+
+    def close(self):
+        if self.chunks is not None:
+            data = self.chunks[0][:0].join(self.chunks) if self.chunks else ''
+            self.chunks = []
+            return ET.fromstring(data)
+        if not self.lxml:
+            return self._parser.close()
+        with _parse_errors():
+            root = self._parser.close()
+        if root is None:
+            raise ET.ParseError('no element found')
+
+    def read_events(self):
+        if self._parser is None:
+            return ()
+        return self._parser.read_events()
+
+
+def tostring(element, encoding=None):
+    """
+    Serialize an element (with its tail) like xml.etree.ElementTree.tostring
+    does, whichever backend parsed it, so the raw XML in the YAML output
+    does not depend on the backend.
+    """
+    if etree is not None and isinstance(element, etree._Element):
+        copy = ET.fromstring(etree.tostring(element, with_tail=False))
+        copy.tail = element.tail
+        element = copy
+    if encoding is None:
+        return ET.tostring(element)
+    return ET.tostring(element, encoding=encoding)
+
+
+def canonical(element):
+    """
+    Return bytes that only two elements with the same contents (tag,
+    attributes in any order, text, tail and children) have in common, to
+    hash them. Faster than tostring(): lxml elements are written in C14N,
+    and ElementTree elements are walked without escaping anything.
+    """
+    if etree is not None and isinstance(element, etree._Element):
+        return etree.tostring(element, method='c14n', with_tail=True)
+    # XML text cannot hold these control characters: they separate the
+    # parts, and stand for a missing text or tail.
+    parts = []
+    for el in element.iter():
+        if el.attrib:
+            parts.append(repr(sorted(el.attrib.items())))
+        text = el.text if el.text is not None else '\x01'
+        tail = el.tail if el.tail is not None else '\x01'
+        parts.append('%s\x00%s\x00%s\x00%d' % (el.tag, text, tail, len(el)))
+    return '\x00'.join(parts).encode('utf-8')
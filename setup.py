@@ -123,9 +123,14 @@ setup(name="jenkins-job-wrecker",
       license='MIT',
       packages=find_packages(),
       install_requires=[
+          'futures; python_version < "3"',
           'pyyaml',
           'python-jenkins',
       ],
+      extras_require={
+          'async': ['aiohttp'],
+          'lxml': ['lxml'],
+      },
       entry_points={
           'console_scripts': [
               'jjwrecker = jenkins_job_wrecker.cli:main',
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import pytest
+import yaml
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web  # noqa: E402
+from jenkins_job_wrecker.aio import convert_server  # noqa: E402
+
+JOB_XML = '<project><description>%s</description></project>'
+VIEW_XML = '<hudson.model.ListView><name>%s</name></hudson.model.ListView>'
+
+
+def fake_jenkins():
+    async def api(request):
+        assert request.query['tree'].startswith('views[name],jobs[')
+        return web.json_response({
+            'views': [{'name': 'all'}, {'name': 'lorem'}],
+            'jobs': [{'name': 'ipsum', 'fullName': 'ipsum'},
+                     {'name': 'folder', 'fullName': 'folder',
+                      'jobs': [{'name': 'nested',
+                                'fullName': 'folder/nested'}]}]})
+
+    async def job_config(request):
+        return web.Response(text=JOB_XML % request.path)
+
+    async def view_config(request):
+        return web.Response(text=VIEW_XML % request.match_info['name'])
+
+    app = web.Application()
+    app.router.add_get('/api/json', api)
+    app.router.add_get('/view/{name}/config.xml', view_config)
+    app.router.add_get('/{path:job/.*}config.xml', job_config)
+    return app
+
+
+async def convert_all():
+    runner = web.AppRunner(fake_jenkins())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        url = 'http://127.0.0.1:%d/' % port
+        return [result async for result in convert_server(url)]
+    finally:
+        await runner.cleanup()
+
+
+class TestConvertServer(object):
+    def test_convert(self):
+        results = asyncio.run(convert_all())
+        converted = dict(((t, name), yaml.safe_load(y))
+                         for t, name, y in results)
+        assert sorted(converted) == [('job', 'folder'),
+                                     ('job', 'folder/nested'),
+                                     ('job', 'ipsum'),
+                                     ('view', 'lorem')]
+        nested = converted[('job', 'folder/nested')][0]['job']
+        assert nested['description'] == '/job/folder/job/nested/config.xml'
+        view = converted[('view', 'lorem')][0]['view']
+        assert view['view-type'] == 'list'
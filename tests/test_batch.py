@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.batch import batch_files, convert_files
+from jenkins_job_wrecker.cache import ResultCache
+from jenkins_job_wrecker.cli import get_context, get_xml_root, root_to_yaml
+import os
+import pytest
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+FIXTURES = ['calamari-clients', 'ice-setup', 'non-ascii']
+
+
+def batch_dir(tmpdir):
+    """ Copy some fixtures to a batch folder, one of them in a subfolder. """
+    for name in FIXTURES:
+        with open(os.path.join(fixtures_path, name + '.xml'), 'rb') as f:
+            xml = f.read()
+        tmpdir.join(name + '.xml').write_binary(xml)
+    tmpdir.join('folder', 'config.xml').write_binary(xml, ensure=True)
+    tmpdir.join('README').write('not XML')
+    return tmpdir
+
+
+class TestBatchFiles(object):
+    def test_directory(self, tmpdir):
+        batch_dir(tmpdir)
+        names = [name for name, _ in batch_files(str(tmpdir))]
+        assert names == FIXTURES + ['folder']
+
+    def test_directory_of_a_job(self, tmpdir):
+        batch_dir(tmpdir)
+        items = batch_files(str(tmpdir.join('folder')))
+        assert items == [('folder', str(tmpdir.join('folder', 'config.xml')))]
+
+    def test_glob(self, tmpdir):
+        batch_dir(tmpdir)
+        items = batch_files(str(tmpdir.join('*', 'config.xml')))
+        assert items == [('folder', str(tmpdir.join('folder', 'config.xml')))]
+
+    def test_list(self, tmpdir):
+        batch_dir(tmpdir)
+        tmpdir.join('list').write('# jobs\n%s\n\n%s\n' % (
+            tmpdir.join('ice-setup.xml'), tmpdir.join('folder', 'config.xml')))
+        names = [name for name, _ in batch_files(str(tmpdir.join('list')))]
+        assert names == ['ice-setup', 'folder']
+
+    def test_duplicates(self, tmpdir):
+        batch_dir(tmpdir)
+        tmpdir.join('list').write('%s\n%s\n' % (
+            tmpdir.join('ice-setup.xml'), tmpdir.join('ice-setup.xml')))
+        with pytest.raises(ValueError):
+            batch_files(str(tmpdir.join('list')))
+
+
+class TestConvertFiles(object):
+    @pytest.mark.parametrize('processes,threads', [(1, False), (2, False),
+                                                   (2, True)])
+    def test_convert(self, tmpdir, processes, threads):
+        batch_dir(tmpdir)
+        tmpdir.join('broken.xml').write('<project><broken')
+        items = batch_files(str(tmpdir))
+        results = list(convert_files(items, processes=processes,
+                                     threads=threads))
+        assert [r[0] for r in results] == [name for name, _ in items]
+        for name, filename, yaml, error in results:
+            if name == 'broken':
+                assert yaml is None
+                assert 'ParseError' in error
+                continue
+            assert error is None
+            root = get_xml_root(filename=filename)
+            assert yaml == root_to_yaml(root, name)
+
+    @pytest.mark.parametrize('threads', [False, True])
+    def test_memo_stats(self, tmpdir, threads):
+        batch_dir(tmpdir)
+        items = batch_files(str(tmpdir))
+        results = list(convert_files(items, processes=2, threads=threads,
+                                     memo_size=100))
+        assert all(error is None for _, _, _, error in results)
+        memo = get_context().memo
+        # Every worker's lookups add up here
+        assert memo.stats['hits'] + memo.stats['misses'] > 0
+
+    @pytest.mark.parametrize('processes', [1, 2])
+    def test_result_cache(self, tmpdir, processes):
+        batch_dir(tmpdir.mkdir('batch'))
+        items = batch_files(str(tmpdir.join('batch')))
+        cache = ResultCache(str(tmpdir.join('cache')))
+        first = list(convert_files(items, processes=processes,
+                                   result_cache=cache))
+        assert cache.stats == {'hits': 0, 'misses': len(items)}
+        second = list(convert_files(items, processes=processes,
+                                    result_cache=cache))
+        assert second == first
+        assert cache.stats['hits'] == len(items)
+        # Other options, other results
+        list(convert_files(items, processes=processes, replace_tabs=True,
+                           result_cache=cache))
+        assert cache.stats['hits'] == len(items)
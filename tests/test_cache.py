@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.cache import ConfigCache, DiskCache, ResultCache
+import os
+import pickle
+import time
+
+
+class TestDiskCache(object):
+    def test_get_set(self, tmpdir):
+        cache = DiskCache(str(tmpdir))
+        assert cache.get('lorem') is None
+        cache.set('lorem', b'ipsum')
+        assert cache.get('lorem') == b'ipsum'
+
+    def test_prune_least_recently_used(self, tmpdir):
+        cache = DiskCache(str(tmpdir), max_size=25)
+        for key in ('a', 'b'):
+            cache.set(key, b'x' * 10)
+        # Make "a" older than "b", then use it.
+        past = time.time() - 100
+        os.utime(cache.filename('a'), (past, past))
+        os.utime(cache.filename('b'), (past + 1, past + 1))
+        assert cache.get('a') is not None
+        cache.set('c', b'x' * 10)
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.get('c') is not None
+        assert cache.disk_usage() <= 25
+
+    def test_replace(self, tmpdir):
+        cache = DiskCache(str(tmpdir))
+        cache.set('a', b'x' * 10)
+        for _ in range(3):
+            cache.set('b', b'x' * 10)
+        assert cache.size == cache.disk_usage() == 20
+
+    def test_prune_stale_temporary_files(self, tmpdir):
+        cache = DiskCache(str(tmpdir))
+        cache.set('a', b'x' * 10)
+        dirname = os.path.dirname(cache.filename('a'))
+        stale = os.path.join(dirname, 'stale.tmp')
+        writing = os.path.join(dirname, 'writing.tmp')
+        for path in (stale, writing):
+            with open(path, 'wb') as f:
+                f.write(b'x')
+        past = time.time() - 2 * 3600
+        os.utime(stale, (past, past))
+        cache.prune()
+        assert not os.path.exists(stale)
+        assert os.path.exists(writing)
+        assert cache.get('a') is not None
+
+
+class TestConfigCache(object):
+    def test_config(self, tmpdir):
+        cache = ConfigCache(str(tmpdir))
+        assert cache.get_config('http://x/job/a/config.xml') == (None, None)
+        validators = {'ETag': '"abc"'}
+        cache.set_config('http://x/job/a/config.xml', validators,
+                         u'<project>テスト\n</project>')
+        assert cache.get_config('http://x/job/a/config.xml') == (
+            validators, u'<project>テスト\n</project>')
+
+
+class TestResultCache(object):
+    def test_yaml(self, tmpdir):
+        cache = ResultCache(str(tmpdir), converter='1')
+        assert cache.get_yaml('abc', 'job', (False,)) is None
+        cache.set_yaml('abc', 'job', (False,), u'- job:\n    name: テスト\n')
+        assert cache.get_yaml('abc', 'job', (False,)) == \
+            u'- job:\n    name: テスト\n'
+        assert cache.get_yaml('abc', 'job', (True,)) is None
+        assert cache.get_yaml('abc', 'other', (False,)) is None
+        assert cache.stats == {'hits': 1, 'misses': 3}
+
+    def test_other_converter(self, tmpdir):
+        ResultCache(str(tmpdir), converter='1').set_yaml('abc', 'job', (),
+                                                         'yaml')
+        assert ResultCache(str(tmpdir), converter='2').get_yaml(
+            'abc', 'job', ()) is None
+
+    def test_compressed(self, tmpdir):
+        cache = ResultCache(str(tmpdir), converter='1')
+        cache.set_yaml('abc', 'job', (), 'x' * 10000)
+        assert cache.disk_usage() < 1000
+
+    def test_damaged(self, tmpdir):
+        cache = ResultCache(str(tmpdir), converter='1')
+        cache.set_yaml('abc', 'job', (), 'yaml')
+        with open(cache.filename(cache.key('abc', 'job', ())), 'wb') as f:
+            f.write(b'not zlib')
+        assert cache.get_yaml('abc', 'job', ()) is None
+
+    def test_pickle(self, tmpdir):
+        cache = ResultCache(str(tmpdir), converter='1')
+        cache.set_yaml('abc', 'job', (), 'yaml')
+        copy = pickle.loads(pickle.dumps(cache))
+        assert copy.stats == {'hits': 0, 'misses': 0}
+        assert copy.get_yaml('abc', 'job', ()) == 'yaml'
+        assert cache.stats == {'hits': 0, 'misses': 0}
@@ -1,13 +1,23 @@
-from jenkins_job_wrecker.cli import parse_args, get_xml_root
+from jenkins_job_wrecker.cli import parse_args, get_xml_root, root_to_yaml, \
+    StreamConverter, stream_to_yaml, iter_file, dump_yaml, \
+    setup_str_presenter, get_context, ConversionContext
+import jenkins_job_wrecker.cli
 import os
 import xml.etree.ElementTree
 import pytest
+import yaml
 
 fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
 
 ice_setup_xml_file = os.path.join(fixtures_path, 'ice-setup.xml')
 
 
+@pytest.fixture
+def default_context(monkeypatch):
+    """ Restore the default conversion context after the test. """
+    monkeypatch.setattr(jenkins_job_wrecker.cli, '_context', get_context())
+
+
 class TestArgParser(object):
 
     # "-f" tests
@@ -23,6 +33,11 @@ class TestArgParser(object):
     def test_ice_setup(self):
         assert parse_args(['-f', ice_setup_xml_file, '-n', 'ice-setup'])
 
+    def test_incremental_file(self):
+        with pytest.raises(SystemExit):
+            parse_args(['-f', ice_setup_xml_file, '-n', 'ice-setup',
+                        '--incremental'])
+
     # "-s" tests
 
     def test_missing_jenkins_server(self):
@@ -45,3 +60,106 @@ class TestGetXmlRoot(object):
     def test_xml_root_with_string(self):
         root = get_xml_root(string='<testing></testing>')
         assert isinstance(root, xml.etree.ElementTree.Element)
+
+
+class TestStreamConverter(object):
+    @pytest.mark.parametrize('size', [1, 100, 65536])
+    def test_same_yaml(self, size):
+        for name in ['ice-setup', 'calamari-clients', 'non-ascii']:
+            filename = os.path.join(fixtures_path, name + '.xml')
+            expected = root_to_yaml(get_xml_root(filename=filename), name)
+            assert stream_to_yaml(iter_file(filename, size), name) == expected
+
+    def test_children_dropped(self):
+        converter = StreamConverter('job')
+        converter.feed('<project><description>d</description><disabled>')
+        assert len(converter.root) == 1
+        converter.feed('true</disabled>')
+        assert len(converter.root) == 0
+        converter.feed('</project>')
+        assert 'disabled: true' in converter.close()
+
+    def test_view(self):
+        xml = ('<hudson.model.ListView><name>v</name>'
+               '<filterExecutors>true</filterExecutors>'
+               '</hudson.model.ListView>')
+        expected = root_to_yaml(get_xml_root(string=xml), 'v')
+        assert stream_to_yaml([xml[:20], xml[20:]], 'v') == expected
+
+    def test_parse_error(self):
+        with pytest.raises(xml.etree.ElementTree.ParseError):
+            stream_to_yaml(['<project><broken'], 'job')
+
+    def test_without_pull_parser(self, monkeypatch):
+        # Python 2's ElementTree parses the whole document.
+        monkeypatch.delattr(xml.etree.ElementTree, 'XMLPullParser')
+        for name in ['ice-setup', 'calamari-clients', 'non-ascii']:
+            filename = os.path.join(fixtures_path, name + '.xml')
+            expected = root_to_yaml(get_xml_root(filename=filename), name)
+            converter = StreamConverter(name, backend='etree')
+            for chunk in iter_file(filename, 100):
+                converter.feed(chunk)
+            assert converter.close() == expected
+        converter = StreamConverter('job', backend='etree')
+        converter.feed('<project><broken')
+        with pytest.raises(xml.etree.ElementTree.ParseError):
+            converter.close()
+
+
+class TestDumpYaml(object):
+    def pure_python(self, build):
+        return yaml.dump(build, Dumper=get_context().python_dumper,
+                         default_flow_style=False, default_style=None)
+
+    @pytest.mark.parametrize('name', ['ice-setup', 'calamari-clients',
+                                      'non-ascii', 'indentation_with_tab'])
+    def test_fixtures(self, name):
+        filename = os.path.join(fixtures_path, name + '.xml')
+        build = yaml.safe_load(root_to_yaml(get_xml_root(filename=filename),
+                                            name))
+        assert dump_yaml(build) == self.pure_python(build)
+
+    def test_double_quoted(self):
+        # libyaml folds long double-quoted scalars differently
+        build = [{'job': {'description': u'\u4f60' * 100 + ' x' * 50}}]
+        assert dump_yaml(build) == self.pure_python(build)
+
+    def test_keep_line_breaks(self, default_context):
+        setup_str_presenter()
+        # libyaml ends the document with "..." after a "|+" block
+        build = [{'job': {'builders': [{'shell': 'make\n\n\n'}]}}]
+        assert dump_yaml(build) == self.pure_python(build)
+
+    def test_replace_tabs(self, default_context):
+        setup_str_presenter(True)
+        build = [{'job': {'builders': [{'shell': 'if a\n\tb\t\nfi'}]}}]
+        assert dump_yaml(build) == self.pure_python(build)
+        assert '\t' not in dump_yaml(build)
+
+
+PIPELINE_XML = """<flow-definition>
+  <description>lorem</description>
+</flow-definition>"""
+
+
+class TestConversionContext(object):
+    def test_input_unchanged(self):
+        root = get_xml_root(string=PIPELINE_XML)
+        output = root_to_yaml(root, 'pipeline')
+        assert 'concurrent: true' in output
+        assert [child.tag for child in root] == ['description']
+        assert stream_to_yaml([PIPELINE_XML], 'pipeline') == output
+
+    def test_side_by_side(self):
+        build = [{'job': {'builders': [{'shell': 'if a\n\tb\nfi'}]}}]
+        tabs = ConversionContext(replace_tabs=True)
+        plain = ConversionContext()
+        assert 'shell: |' in dump_yaml(build, context=tabs)
+        # Tabs keep the string double-quoted
+        assert 'shell: "if a' in dump_yaml(build, context=plain)
+        assert 'shell: |' in dump_yaml(build, context=tabs)
+
+    def test_global_dumpers_untouched(self, default_context):
+        setup_str_presenter(True)
+        represent_str = yaml.representer.SafeRepresenter.represent_str
+        assert yaml.Dumper.yaml_representers[str] is represent_str
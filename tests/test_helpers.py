@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.helpers import replace_tab
+
+
+class TestReplaceTab(object):
+    def test_tab_stops(self):
+        assert replace_tab('\ta') == '    a'
+        assert replace_tab('a\tb') == 'a   b'
+        assert replace_tab('abc\td') == 'abc d'
+        assert replace_tab('abcd\te') == 'abcd    e'
+        assert replace_tab('a\tb', tab_stop=8) == 'a       b'
+
+    def test_line_breaks(self):
+        # Columns keep counting after line breaks
+        assert replace_tab('ab\n\tc') == 'ab\n c'
+
+    def test_long_line(self):
+        line = 'x\t' * 100000
+        assert replace_tab(line) == 'x   ' * 100000
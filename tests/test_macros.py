@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.cli import dump_yaml, get_context, \
+    setup_str_presenter
+from jenkins_job_wrecker.macros import MACROS_NAME, MacroIndex, MacroWriter, \
+    expand, load_macros
+from jenkins_job_wrecker.writers import OutputWriter, StreamWriter
+import jenkins_job_wrecker.cli
+import os
+import pytest
+import yaml
+
+SHELL = {'shell': 'make -C build all check install DESTDIR=/tmp/install'}
+ARCHIVE = {'archive': {'artifacts': 'build/**/*.tar.gz',
+                       'allow-empty': False}}
+
+
+def job(name, builders=(SHELL,), publishers=(ARCHIVE,)):
+    return {'job': {'name': name, 'builders': [dict(b) for b in builders],
+                    'publishers': [dict(p) for p in publishers]}}
+
+
+class TestMacroIndex(object):
+    def test_shared_blocks(self):
+        index = MacroIndex(2)
+        jobs = [job('a')['job'], job('b')['job'],
+                job('c', builders=[{'shell': 'x' * 100}])['job']]
+        for settings in jobs:
+            index.add(settings)
+        assert index.assign() == 2
+        assert [index.apply(settings) for settings in jobs] == \
+            [True, True, True]
+        assert jobs[0]['builders'] == jobs[1]['builders']
+        assert jobs[0]['builders'][0].startswith('shell-')
+        assert jobs[2]['builders'] == [{'shell': 'x' * 100}]
+        assert jobs[0]['publishers'] == jobs[2]['publishers']
+        macros = load_macros(index.macros())
+        assert macros[('builders', jobs[0]['builders'][0])] == [SHELL]
+        assert macros[('publishers', jobs[0]['publishers'][0])] == [ARCHIVE]
+
+    def test_min_count(self):
+        index = MacroIndex(3)
+        for name in 'ab':
+            index.add(job(name)['job'])
+        assert index.assign() == 0
+
+    def test_small_blocks(self):
+        index = MacroIndex(2)
+        jobs = [job(name, builders=[{'shell': 'make'}])['job']
+                for name in 'ab']
+        for settings in jobs:
+            index.add(settings)
+        index.assign()
+        assert jobs[0]['builders'] == [{'shell': 'make'}]
+
+    def test_repeated_in_a_job(self):
+        index = MacroIndex(2)
+        settings = job('a', builders=[SHELL, SHELL])['job']
+        index.add(settings)
+        assert index.assign() == 0
+        index.apply(settings)
+        assert settings['builders'][0] is not settings['builders'][1]
+        assert '&' not in dump_yaml([{'job': settings}])
+
+    def test_template_parameters(self):
+        # Macros do not see the parameters of a job template.
+        index = MacroIndex(2)
+        for name in 'ab':
+            index.add({'name': name, 'scm': [{'git': {
+                'url': '{url}', 'branches': ['main'], 'wipe': True}}]})
+        assert index.assign() == 0
+
+
+class TestExpand(object):
+    def test_round_trip(self):
+        index = MacroIndex(2)
+        jobs = [job(name) for name in 'ab']
+        for definition in jobs:
+            index.add(definition['job'])
+        index.assign()
+        for definition in jobs:
+            index.apply(definition['job'])
+        macros = load_macros(index.macros())
+        for definition in jobs:
+            assert expand(definition['job'], macros)
+            assert definition == job(definition['job']['name'])
+        assert not expand(jobs[0]['job'], macros)
+
+
+def read(path):
+    with open(str(path)) as f:
+        return yaml.safe_load(f)
+
+
+class TestMacroWriter(object):
+    def run(self, tmpdir, names, min_count=2):
+        with MacroWriter(OutputWriter(str(tmpdir)), min_count) as writer:
+            for name in names:
+                writer.write(name, dump_yaml([job(name)]))
+        return writer
+
+    def test_output_dir(self, tmpdir):
+        writer = self.run(tmpdir, ['a', 'folder/b'])
+        assert writer.stats['new'] == 3
+        macros = read(tmpdir.join(MACROS_NAME + '.yml'))
+        assert sorted(next(iter(macro)) for macro in macros) == \
+            ['builder', 'publisher']
+        a = read(tmpdir.join('a.yml'))
+        assert a[0]['job']['builders'] == [macros[0]['builder']['name']]
+        assert read(tmpdir.join('folder', 'b.yml'))[0]['job']['builders'] == \
+            a[0]['job']['builders']
+
+    def test_rerun_unchanged(self, tmpdir):
+        self.run(tmpdir, ['a', 'b'])
+        writer = self.run(tmpdir, ['a', 'b'])
+        assert writer.stats['written'] == 0
+        assert writer.stats['unchanged'] == 3
+
+    def test_jobs_of_earlier_runs(self, tmpdir):
+        first = self.run(tmpdir, ['a', 'b'])
+        # "a" and "b" share their blocks with "c", and macros keep their
+        # names, so only "c" is written.
+        writer = self.run(tmpdir, ['c'], 3)
+        assert writer.stats['written'] == 1
+        assert writer.stats['unchanged'] == 3
+        # Three jobs of the same size, counted without macros
+        assert writer.size == first.size * 3 // 2
+        a = read(tmpdir.join('a.yml'))
+        assert read(tmpdir.join('c.yml'))[0]['job']['builders'] == \
+            a[0]['job']['builders']
+        # And back with more jobs needed than there are.
+        self.run(tmpdir, ['c'], 4)
+        assert read(tmpdir.join('a.yml')) == [job('a')]
+        assert not tmpdir.join(MACROS_NAME + '.yml').check()
+
+    def test_original_yaml(self, tmpdir, monkeypatch):
+        # A literal block loses its last line break when it is loaded and
+        # dumped again.
+        monkeypatch.setattr(jenkins_job_wrecker.cli, '_context',
+                            get_context())
+        setup_str_presenter()
+        settings = job('a', builders=[{'shell': 'cd build\nmake\n\n'}])
+        output = dump_yaml([settings])
+        assert dump_yaml(yaml.safe_load(output)) != output
+        for _ in range(2):
+            with MacroWriter(OutputWriter(str(tmpdir)), 1000) as writer:
+                writer.write('a', output)
+            assert tmpdir.join('a.yml').read() == output
+        assert writer.stats['unchanged'] == 1
+
+    def test_incomplete(self, tmpdir):
+        with pytest.raises(KeyboardInterrupt):
+            with MacroWriter(OutputWriter(str(tmpdir))) as writer:
+                writer.write('a', dump_yaml([job('a')]))
+                raise KeyboardInterrupt()
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_stream(self, tmpdir):
+        path = tmpdir.join('all.yml')
+        with MacroWriter(StreamWriter(str(path))) as writer:
+            for name in 'ab':
+                with writer.open(name) as f:
+                    f.write(dump_yaml([job(name)]))
+        definitions = read(path)
+        assert len(definitions) == 4
+        assert load_macros(definitions)
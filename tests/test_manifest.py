@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.manifest import Manifest
+
+
+class TestManifest(object):
+    def run(self, output_dir, configs, options='', partial=False,
+            converter=None):
+        """ Pretend to convert "configs" and return the converted names. """
+        manifest = Manifest(output_dir, options, converter)
+        converted = []
+        for name, xml in configs.items():
+            if manifest.is_current('job', name, xml):
+                continue
+            output = output_dir.join(name + '.yml')
+            output.write('')
+            manifest.record('job', name, xml, str(output))
+            converted.append(name)
+        manifest.save(partial)
+        return sorted(converted), manifest
+
+    def test_unchanged(self, tmpdir):
+        configs = {'a': '<project/>', 'b': u'<project>テスト</project>'}
+        assert self.run(tmpdir, configs)[0] == ['a', 'b']
+        assert self.run(tmpdir, configs)[0] == []
+
+    def test_changed(self, tmpdir):
+        self.run(tmpdir, {'a': '<project/>', 'b': '<project/>'})
+        converted, _ = self.run(tmpdir, {'a': '<project/>',
+                                         'b': '<project><disabled/></project>'})
+        assert converted == ['b']
+
+    def test_converter_changed(self, tmpdir):
+        self.run(tmpdir, {'a': '<project/>'})
+        assert self.run(tmpdir, {'a': '<project/>'}, '-t')[0] == ['a']
+
+    def test_plugins_changed(self, tmpdir):
+        self.run(tmpdir, {'a': '<project/>'}, converter='plugins-1')
+        assert self.run(tmpdir, {'a': '<project/>'},
+                        converter='plugins-1')[0] == []
+        assert self.run(tmpdir, {'a': '<project/>'},
+                        converter='plugins-2')[0] == ['a']
+
+    def test_output_missing(self, tmpdir):
+        self.run(tmpdir, {'a': '<project/>'})
+        tmpdir.join('a.yml').remove()
+        assert self.run(tmpdir, {'a': '<project/>'})[0] == ['a']
+
+    def test_removed(self, tmpdir):
+        self.run(tmpdir, {'a': '<project/>', 'b': '<project/>'})
+        _, manifest = self.run(tmpdir, {'a': '<project/>'})
+        assert [entry['name'] for entry in manifest.removed()] == ['b']
+        _, manifest = self.run(tmpdir, {'a': '<project/>'})
+        assert manifest.removed() == []
+
+    def test_partial(self, tmpdir):
+        self.run(tmpdir, {'a': '<project/>', 'b': '<project/>'})
+        self.run(tmpdir, {'a': '<project/>'}, partial=True)
+        assert self.run(tmpdir, {'b': '<project/>'}, partial=True)[0] == []
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.cli import ConversionContext, get_xml_root, \
+    root_to_yaml, stream_to_yaml
+from jenkins_job_wrecker.memo import PROBES, SubtreeMemo, subtree_hash
+from jenkins_job_wrecker import xmlparser
+import os
+import pytest
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture(params=xmlparser.BACKENDS)
+def backend(request):
+    if request.param == 'lxml':
+        pytest.importorskip('lxml')
+    previous = xmlparser.get_backend()
+    xmlparser.set_backend(request.param)
+    yield request.param
+    xmlparser.set_backend(previous)
+
+
+def element(xml):
+    return get_xml_root(string='<project>%s</project>' % xml)[0]
+
+
+class TestSubtreeHash(object):
+    def test_attribute_order(self, backend):
+        assert subtree_hash(element('<a x="1" y="2"><b/></a>')) == \
+            subtree_hash(element('<a y="2" x="1"><b/></a>'))
+
+    @pytest.mark.parametrize('other', [
+        '<a><b>None</b></a>',
+        '<a><b/>tail</a>',
+        '<a><b><c/></b></a>',
+        '<a><b/><c/></a>',
+        '<a><b x=""/></a>',
+    ])
+    def test_different(self, backend, other):
+        assert subtree_hash(element('<a><b/></a>')) != \
+            subtree_hash(element(other))
+
+    def test_extra(self, backend):
+        a = element('<a><b/></a>')
+        assert subtree_hash(a, False) != subtree_hash(a, True)
+
+
+class TestSubtreeMemo(object):
+    def test_hit(self):
+        memo = SubtreeMemo()
+        calls = []
+
+        def convert():
+            calls.append(1)
+            return [['publishers', [{'a': {'b': ['c']}}]]]
+        first = memo.convert(element('<a><b/></a>'), convert)
+        second = memo.convert(element('<a><b/></a>'), convert)
+        assert first == second
+        assert len(calls) == 1
+        assert memo.stats['hits'] == 1
+        assert memo.stats['misses'] == 1
+        # Changing a result does not change the memo
+        second[0][1][0]['a']['b'].append('d')
+        assert memo.convert(element('<a><b/></a>'), convert) == first
+
+    def test_leaves_not_hashed(self):
+        memo = SubtreeMemo()
+        memo.convert(element('<a>x</a>'), list)
+        assert memo.stats['misses'] == 0
+        assert not memo.results
+
+    def test_evicts_least_recently_used(self):
+        memo = SubtreeMemo(2)
+        for xml in ['<a><b/></a>', '<a><c/></a>', '<a><b/></a>',
+                    '<a><d/></a>']:
+            memo.convert(element(xml), list)
+        assert len(memo.results) == 2
+        assert subtree_hash(element('<a><b/></a>')) in memo.results
+        assert subtree_hash(element('<a><c/></a>')) not in memo.results
+
+    def test_stops_hashing(self):
+        memo = SubtreeMemo()
+        memo.probes['a'] = [PROBES, -1.0, 0]
+        memo.convert(element('<a><b/></a>'), list)
+        assert not memo.results
+
+    def test_add_stats(self):
+        memo = SubtreeMemo()
+        memo.add_stats({'hits': 3, 'misses': 1, 'saved': 0.5})
+        assert memo.summary() == \
+            'reused 3 of 4 converted elements (75%), saving 0.50s'
+
+    def test_overhead(self):
+        memo = SubtreeMemo()
+        memo.add_stats({'hits': 1, 'misses': 9, 'saved': -0.001})
+        assert memo.summary() == \
+            'reused 1 of 10 converted elements (10%), at a cost of 0.00s'
+
+
+class TestConvertWithMemo(object):
+    @pytest.mark.parametrize('name', ['ice-setup', 'calamari-clients',
+                                      'non-ascii'])
+    def test_same_yaml(self, name):
+        filename = os.path.join(fixtures_path, name + '.xml')
+        context = ConversionContext(memo_size=100)
+        expected = root_to_yaml(get_xml_root(filename=filename), name,
+                                context=ConversionContext())
+        for _ in range(2):
+            root = get_xml_root(filename=filename)
+            assert root_to_yaml(root, name, context=context) == expected
+            with open(filename, 'rb') as f:
+                assert stream_to_yaml([f.read()], name,
+                                      context=context) == expected
+        assert context.memo.stats['hits']
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.cli import ConversionContext, get_xml_root, root_to_yaml
+from jenkins_job_wrecker.helpers import gen_raw
+from jenkins_job_wrecker.modules.builders import Builders
+from jenkins_job_wrecker.modules.handlers import Handlers
+from jenkins_job_wrecker.modules.scm import Scm
+from jenkins_job_wrecker.registry import DuplicateEntryPoint, Lazy, Registry, get_registry
+import jenkins_job_wrecker.registry
+import pytest
+
+ACTIONS_XML = '''<project>
+  <actions><hudson.model.SomeAction/></actions>
+  <description>lorem</description>
+</project>'''
+
+
+PIPELINE_XML = '''<flow-definition>
+  <definition class="org.jenkinsci.plugins.workflow.cps.CpsScmFlowDefinition">
+    <scm class="hudson.plugins.git.GitSCM">
+      <userRemoteConfigs><hudson.plugins.git.UserRemoteConfig>
+        <url>https://example.com/repo.git</url>
+      </hudson.plugins.git.UserRemoteConfig></userRemoteConfigs>
+    </scm>
+    <scriptPath>Jenkinsfile</scriptPath>
+  </definition>
+</flow-definition>'''
+
+
+class TestGetRegistry(object):
+    def test_built_once(self):
+        assert get_registry() is get_registry()
+
+    def test_handler_cached(self):
+        reg = get_registry()
+        assert reg.get_handler(Handlers) is reg.get_handler(Handlers)
+
+
+class TestIgnoreActions(object):
+    def test_per_conversion(self):
+        root = get_xml_root(string=ACTIONS_XML)
+        assert 'lorem' in root_to_yaml(root, 'test', ignore_actions=True)
+        # The shared registry must not remember the previous option.
+        with pytest.raises(NotImplementedError):
+            root_to_yaml(root, 'test')
+
+
+class FakeEntryPoint(object):
+    def __init__(self, name, obj):
+        self.name = name
+        self.value = 'fake:%s' % name
+        self.obj = obj
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return self.obj
+
+
+class TestEntryPoints(object):
+    @pytest.fixture
+    def registry(self, monkeypatch):
+        # A new registry starts from empty tables.
+        return Registry()
+
+    def test_loaded_on_first_use(self, registry, monkeypatch):
+        def fakebuilder(xml, parent):
+            parent.append({'fake': xml.text})
+        ep = FakeEntryPoint('fakebuilder', fakebuilder)
+        monkeypatch.setattr(jenkins_job_wrecker.registry, 'iter_entry_points',
+                            lambda group: [ep])
+        registry.register('builders')
+        assert ep.loads == 0
+        parent = []
+        for _ in range(2):
+            xml = get_xml_root(string='<fakebuilder>x</fakebuilder>')
+            registry.dispatch('builders', 'fakebuilder', xml, parent)
+        assert parent == [{'fake': 'x'}, {'fake': 'x'}]
+        assert ep.loads == 1
+
+    def test_handler_modules_lazy(self, registry):
+        assert isinstance(registry.registry['handlers']['scm'], Lazy)
+        registry.lookup('handlers', 'scm')
+        assert registry.registry['handlers']['scm'] is Scm
+
+    def test_duplicate(self, registry, monkeypatch):
+        eps = [FakeEntryPoint('dup', None), FakeEntryPoint('dup', None)]
+        monkeypatch.setattr(jenkins_job_wrecker.registry, 'iter_entry_points',
+                            lambda group: eps)
+        with pytest.raises(DuplicateEntryPoint):
+            registry.register('builders')
+
+
+class TestConverters(object):
+    def test_unknown_tag_is_raw(self):
+        builders = get_registry().get_handler(Builders)
+        convert = builders.converter('org.example.UnknownBuilder')
+        assert convert is gen_raw
+        assert builders.converter('org.example.UnknownBuilder') is convert
+
+    def test_compiled_once(self):
+        reg = get_registry()
+        reg.get_handler(Builders)
+        assert reg.lookup('builders', 'shell') is reg.lookup('builders', 'shell')
+        assert reg.lookup('builders', 'nosuchbuilder') is None
+
+
+class TestFreeze(object):
+    def test_own_tables(self):
+        registry = Registry()
+        registry.register('builders')
+        assert 'builders' not in Registry().registry
+
+    def test_frozen(self):
+        registry = Registry()
+        registry.freeze()
+        assert not isinstance(registry.registry['handlers']['scm'], Lazy)
+        converters = dict(registry.converters)
+        assert registry.lookup('builders', 'shell') is not None
+        assert registry.lookup('builders', 'nosuchbuilder') is None
+        # Unknown names are not recorded
+        assert registry.converters == converters
+
+    def test_pipeline_definition(self, monkeypatch):
+        # The nested elements of a pipeline use the registry of the context
+        # too, never the process-wide one.
+        monkeypatch.setattr(jenkins_job_wrecker.registry, '_registry', None)
+        registry = Registry()
+        registry.freeze()
+        root = get_xml_root(string=PIPELINE_XML)
+        output = root_to_yaml(root, 'test',
+                              context=ConversionContext(registry=registry))
+        assert 'https://example.com/repo.git' in output
+        assert 'script-path: Jenkinsfile' in output
+        assert jenkins_job_wrecker.registry._registry is None
+
+
+class TestSnapshot(object):
+    @pytest.fixture
+    def registry(self, monkeypatch):
+        monkeypatch.setattr(jenkins_job_wrecker.registry, '_entry_points',
+                            None)
+        return Registry()
+
+    @pytest.fixture
+    def plugins(self, monkeypatch):
+        group = 'jenkins_job_wrecker.projects'
+        eps = {group: [FakeEntryPoint('myproject', {'my-project': 'mine'})]}
+        monkeypatch.setattr(jenkins_job_wrecker.registry, 'scan_entry_points',
+                            lambda: eps)
+        return eps[group]
+
+    def test_reused(self, registry, plugins, tmpdir):
+        path = str(tmpdir.join('plugins.json'))
+        assert not registry.load_snapshot(path)
+        assert registry.get_project_types()['my-project'] == 'mine'
+        registry.project_types.clear()
+        assert registry.load_snapshot(path)
+        assert registry.get_project_types()['my-project'] == 'mine'
+        assert plugins[0].loads == 1
+
+    def test_invalidated(self, registry, plugins, tmpdir, monkeypatch):
+        path = str(tmpdir.join('plugins.json'))
+        registry.load_snapshot(path)
+        monkeypatch.setattr(jenkins_job_wrecker.registry, 'distributions_key',
+                            lambda: 'new')
+        assert not registry.load_snapshot(path)
+
+    def test_converter_key(self, registry, plugins, tmpdir, monkeypatch):
+        path = str(tmpdir.join('plugins.json'))
+        registry.load_snapshot(path)
+        scans = []
+        monkeypatch.setattr(jenkins_job_wrecker.registry, 'scan_entry_points',
+                            lambda: scans.append(1) or {})
+        registry = Registry()
+        assert registry.load_snapshot(path)
+        key = registry.converter_key()
+        assert scans == []
+        # Installing a plugin changes the snapshot, and the key.
+        monkeypatch.setattr(jenkins_job_wrecker.registry, 'distributions_key',
+                            lambda: 'new')
+        registry.load_snapshot(path)
+        assert registry.converter_key() != key
+
+    def test_duplicate(self, registry, plugins, tmpdir):
+        plugins.append(FakeEntryPoint('myproject', {}))
+        with pytest.raises(DuplicateEntryPoint):
+            registry.load_snapshot(str(tmpdir.join('plugins.json')))
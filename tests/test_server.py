@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.cache import ConfigCache
+from jenkins_job_wrecker.server import ConfigFetcher, get_inventory, \
+    inventory_tree, job_url, ordered_map, parse_inventory, view_url
+import jenkins
+import json
+import random
+import threading
+import time
+import pytest
+
+
+def job(fullname, **kwargs):
+    kwargs.update(name=fullname.split('/')[-1], fullName=fullname)
+    return kwargs
+
+
+# "deep" has more folder levels than the first request asked for.
+INVENTORY = {
+    '': {'views': [{'name': 'all'}, {'name': 'lorem'}],
+         'jobs': [job('ipsum', lastBuild={'number': 3}),
+                  job('folder', jobs=[job('folder/nested'),
+                                      job('folder/deep', jobs=[{}])])]},
+    'job/folder/job/deep/': {'jobs': [job('folder/deep/deeper')]},
+}
+
+
+class FakeJenkins(object):
+    def __init__(self, url, username=None, password=None):
+        self.url = url
+        self.server = url
+        self.requests = []
+
+    def jenkins_request(self, request):
+        self.requests.append((request.url, request.headers))
+        if request.headers.get('If-None-Match') == '"1"':
+            return FakeResponse(304, '', {})
+        return FakeResponse(200, '<project/>', {'ETag': '"1"'})
+
+    def jenkins_open(self, request):
+        path = request.url[len(self.server):-len('api/json')]
+        self.requests.append((path, request.params['tree']))
+        return json.dumps(INVENTORY[path])
+
+    def get_job_config(self, name):
+        return '<project><description>%s</description></project>' % name
+
+    def get_view_config(self, name):
+        return '<hudson.model.ListView><name>%s</name>' \
+               '</hudson.model.ListView>' % name
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, text, headers):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+
+class TestOrderedMap(object):
+    def test_order(self):
+        def slow(item):
+            time.sleep(random.random() / 100)
+            return item
+        items = list(range(50))
+        assert list(ordered_map(slow, items, workers=8)) == items
+
+    def test_bounded(self):
+        started = []
+
+        def record(item):
+            started.append(item)
+            return item
+        results = ordered_map(record, iter(range(1000)), workers=4)
+        assert next(results) == 0
+        time.sleep(0.05)
+        assert len(started) <= 8
+        results.close()
+
+    def test_error(self):
+        def fail(item):
+            if item == 3:
+                raise ValueError(item)
+            return item
+        with pytest.raises(ValueError):
+            list(ordered_map(fail, range(10), workers=4))
+
+
+class TestConfigFetcher(object):
+    @pytest.fixture
+    def fetcher(self, monkeypatch):
+        monkeypatch.setattr(jenkins, 'Jenkins', FakeJenkins)
+        return ConfigFetcher('http://jenkins.example.com/')
+
+    def test_fetch(self, fetcher):
+        assert 'lorem' in fetcher.fetch('job', 'lorem')
+        assert 'ipsum' in fetcher.fetch('view', 'ipsum')
+        with pytest.raises(ValueError):
+            fetcher.fetch('folder', 'lorem')
+
+    def test_cached(self, fetcher, tmpdir):
+        fetcher.cache = ConfigCache(str(tmpdir))
+        assert fetcher.fetch('job', 'a/b') == '<project/>'
+        assert fetcher.fetch('job', 'a/b') == '<project/>'
+        first, second = fetcher.server.requests
+        assert first[0] == 'http://jenkins.example.com/job/a/job/b/config.xml'
+        assert 'If-None-Match' not in first[1]
+        assert second[1]['If-None-Match'] == '"1"'
+
+    def test_session_per_thread(self, fetcher):
+        servers = []
+        thread = threading.Thread(target=lambda: servers.append(fetcher.server))
+        thread.start()
+        thread.join()
+        assert fetcher.server is fetcher.server
+        assert servers[0] is not fetcher.server
+
+
+class TestInventory(object):
+    def test_job_url(self):
+        assert job_url('a/b c') == 'job/a/job/b%20c/'
+
+    def test_view_url(self):
+        assert view_url('lorem') == 'view/lorem/'
+        assert view_url('a/lorem') == 'job/a/view/lorem/'
+
+    def test_tree(self):
+        tree = inventory_tree(depth=2)
+        assert tree.count('jobs[') == 2
+        assert tree.endswith(',jobs]]')
+
+    def test_parse(self):
+        jobs, folders = parse_inventory(INVENTORY[''])
+        assert [j['fullname'] for j in jobs] == ['ipsum', 'folder',
+                                                 'folder/nested',
+                                                 'folder/deep']
+        assert jobs[0]['lastBuild'] == {'number': 3}
+        assert folders == ['folder/deep']
+
+    def test_get_inventory(self):
+        server = FakeJenkins('http://jenkins.example.com/')
+        jobs, views = get_inventory(server)
+        assert [j['fullname'] for j in jobs][-1] == 'folder/deep/deeper'
+        assert views == [{'name': 'all'}, {'name': 'lorem'}]
+        assert [path for path, _ in server.requests] == [
+            '', 'job/folder/job/deep/']
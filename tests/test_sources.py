@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.cli import get_xml_root, root_to_yaml
+from jenkins_job_wrecker.sources import (archive_configs,
+                                         archive_global_config,
+                                         archive_job_name, jenkins_home_jobs,
+                                         jenkins_home_views)
+import jenkins_job_wrecker.sources
+import io
+import os
+import tarfile
+import yaml
+import zipfile
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+GLOBAL_CONFIG = '''<?xml version='1.1' encoding='UTF-8'?>
+<hudson>
+  <views>
+    <hudson.model.AllView>
+      <owner class="hudson" reference="../../.."/>
+      <name>all</name>
+    </hudson.model.AllView>
+    <hudson.model.ListView>
+      <owner class="hudson" reference="../../.."/>
+      <name>lorem</name>
+      <filterExecutors>false</filterExecutors>
+    </hudson.model.ListView>
+  </views>
+</hudson>
+'''
+
+
+def jenkins_home(tmpdir):
+    """ Create a JENKINS_HOME with a job, a folder and a nested job. """
+    with open(os.path.join(fixtures_path, 'ice-setup.xml')) as f:
+        job_xml = f.read()
+    tmpdir.join('config.xml').write(GLOBAL_CONFIG)
+    tmpdir.join('jobs', 'ice-setup', 'config.xml').write(job_xml, ensure=True)
+    folder = tmpdir.join('jobs', 'folder')
+    folder.join('config.xml').write(
+        '<com.cloudbees.hudson.plugins.folder.Folder/>', ensure=True)
+    folder.join('jobs', 'nested', 'config.xml').write(job_xml, ensure=True)
+    # Not a job: no config.xml
+    tmpdir.join('jobs', 'empty').ensure(dir=True)
+    # XML 1.1, with a character that XML 1.0 parsers refuse
+    tmpdir.join('users', 'admin', 'config.xml').write(
+        "<?xml version='1.1' encoding='UTF-8'?>\n"
+        '<user><fullName>&#x1b;[1madmin</fullName></user>', ensure=True)
+    return str(tmpdir)
+
+
+class TestJenkinsHome(object):
+    def test_jobs(self, tmpdir):
+        home = jenkins_home(tmpdir)
+        jobs = list(jenkins_home_jobs(os.path.join(home, 'jobs')))
+        assert [name for name, _ in jobs] == ['folder', 'folder/nested',
+                                              'ice-setup']
+        assert jobs[1][1] == os.path.join(home, 'jobs', 'folder', 'jobs',
+                                          'nested', 'config.xml')
+
+    def test_without_scandir(self, tmpdir, monkeypatch):
+        # Python 2
+        monkeypatch.setattr(jenkins_job_wrecker.sources, 'scandir', None)
+        home = jenkins_home(tmpdir)
+        jobs = list(jenkins_home_jobs(os.path.join(home, 'jobs')))
+        assert [name for name, _ in jobs] == ['folder', 'folder/nested',
+                                              'ice-setup']
+
+    def test_no_jobs(self, tmpdir):
+        assert list(jenkins_home_jobs(str(tmpdir.join('jobs')))) == []
+
+    def test_views(self, tmpdir):
+        views = list(jenkins_home_views(jenkins_home(tmpdir)))
+        assert [name for name, _ in views] == ['lorem']
+        root = get_xml_root(string=views[0][1])
+        view = yaml.safe_load(root_to_yaml(root, 'lorem'))[0]['view']
+        assert view['filter-executors'] is False
+
+
+class TestArchive(object):
+    def test_job_name(self):
+        assert archive_job_name('jobs/a/config.xml') == 'a'
+        assert archive_job_name('./jenkins/jobs/a/config.xml') == 'a'
+        assert archive_job_name('jobs/a/jobs/b/config.xml') == 'a/b'
+        assert archive_job_name('config.xml') is None
+        assert archive_job_name('users/admin/config.xml') is None
+        assert archive_job_name(
+            'jobs/m/configurations/axis-x/1/config.xml') is None
+
+    def test_global_config(self):
+        assert archive_global_config('config.xml')
+        assert archive_global_config('./jenkins/config.xml')
+        assert not archive_global_config('users/admin/config.xml')
+        assert not archive_global_config('jenkins/nodes/agent/config.xml')
+        assert not archive_global_config(
+            'jobs/m/configurations/axis-x/1/config.xml')
+
+    def test_tar(self, tmpdir):
+        home = jenkins_home(tmpdir.mkdir('jenkins'))
+        archive = str(tmpdir.join('backup.tar.gz'))
+        with tarfile.open(archive, 'w:gz') as tar:
+            tar.add(home, arcname='jenkins')
+        # Read it as a pipe: without seeking.
+        with open(archive, 'rb') as f:
+            stream = io.BufferedReader(io.BytesIO(f.read()))
+        stream.seekable = lambda: False
+        configs = list(archive_configs(stream))
+        names = sorted((t, name) for t, name, _ in configs)
+        assert names == [('job', 'folder'), ('job', 'folder/nested'),
+                         ('job', 'ice-setup'), ('view', 'lorem')]
+
+    def test_zip(self, tmpdir):
+        home = jenkins_home(tmpdir.mkdir('jenkins'))
+        archive = str(tmpdir.join('backup.zip'))
+        with zipfile.ZipFile(archive, 'w') as z:
+            for dirpath, _, filenames in os.walk(home):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    z.write(path, os.path.relpath(path, home))
+        with open(archive, 'rb') as f:
+            configs = {name: xml for _, name, xml in archive_configs(f)}
+        assert sorted(configs) == ['folder', 'folder/nested', 'ice-setup',
+                                   'lorem']
+        with open(os.path.join(fixtures_path, 'ice-setup.xml'), 'rb') as f:
+            assert configs['ice-setup'] == f.read()
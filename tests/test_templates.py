@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.cli import dump_yaml
+from jenkins_job_wrecker.macros import MacroWriter
+from jenkins_job_wrecker.memo import copy_data
+from jenkins_job_wrecker.templates import TEMPLATES_DIR, TemplateIndex, \
+    escape, expand_templates, flatten, parameter_names, unescape
+from jenkins_job_wrecker.writers import OutputWriter
+from jenkins_jobs.cli.entry import JenkinsJobs
+import os
+import pytest
+import yaml
+
+BUILDERS = [{'shell': 'make -C build all check install'
+             ' DESTDIR=/tmp/install-%d V=1' % i} for i in range(10)]
+
+
+def job(name, url='git@example.com:repo.git', node='builder', **settings):
+    settings.update({
+        'name': name,
+        'node': node,
+        'description': 'Builds ${BRANCH} of {project}',
+        'concurrent': False,
+        'scm': [{'git': {'url': url, 'branches': ['main']}}],
+        'builders': copy_data(BUILDERS),
+    })
+    return settings
+
+
+def fleet(count=5):
+    return dict(('job-%d' % i, job('job-%d' % i,
+                                   url='git@example.com:repo-%d.git' % i,
+                                   node='builder-%d' % (i % 2)))
+                for i in range(count))
+
+
+def templates_of(jobs, min_count=2):
+    index = TemplateIndex(min_count)
+    for name, settings in sorted(jobs.items()):
+        index.add(name, settings)
+    return index.templates()
+
+
+class TestEscape(object):
+    @pytest.mark.parametrize('value', ['{x}', '${{x}}', '}{', 'plain', 1,
+                                       None, True])
+    def test_round_trip(self, value):
+        assert unescape(escape(value)) == value
+
+    def test_escape(self):
+        assert escape('${HOME} {x}') == '${{HOME}} {{x}}'
+
+
+class TestFlatten(object):
+    def test_flatten(self):
+        assert flatten({'a': [{'b': 1}, 'c'], 'd': {}, 'e': []}) == [
+            (('a', 0, 'b'), 1), (('a', 1), 'c'), (('d',), {}), (('e',), [])]
+
+
+class TestParameterNames(object):
+    def test_names(self):
+        names = parameter_names([('scm', 0, 'git', 'url'), ('node',),
+                                 ('properties', 0, 'github', 'url'),
+                                 ('builders', 1, 'shell'),
+                                 ('builders', 2, 'shell'), ('name', 0)])
+        assert names == {
+            ('scm', 0, 'git', 'url'): 'url',
+            ('node',): 'node',
+            ('properties', 0, 'github', 'url'): 'github_url',
+            ('builders', 1, 'shell'): 'shell',
+            ('builders', 2, 'shell'): 'builders_shell',
+            ('name', 0): 'name_2',
+        }
+
+
+class TestTemplateIndex(object):
+    def test_near_duplicates(self):
+        templates = templates_of(fleet())
+        assert len(templates) == 1
+        template = templates[0]
+        assert sorted(template.names) == ['job-%d' % i for i in range(5)]
+        assert sorted(template.parameters.values()) == ['name', 'node', 'url']
+        assert template.body['scm'][0]['git']['url'] == '{url}'
+        assert template.body['description'] == \
+            'Builds ${{BRANCH}} of {{project}}'
+
+    def test_min_count(self):
+        assert templates_of(fleet(2), 3) == []
+
+    def test_different_structure(self):
+        jobs = fleet(2)
+        jobs['job-1']['wrappers'] = [{'timestamps': None}]
+        assert templates_of(jobs) == []
+
+    def test_too_many_differences(self):
+        jobs = fleet(2)
+        for i, builder in enumerate(jobs['job-1']['builders']):
+            builder['shell'] += ' V=%d' % i
+        assert templates_of(jobs) == []
+
+    def test_types(self):
+        jobs = fleet(3)
+        jobs['job-1']['concurrent'] = 0
+        template, = templates_of(jobs)
+        assert template.body['concurrent'] == '{concurrent}'
+
+    def test_stable_ids(self):
+        first, = templates_of(fleet())
+        jobs = fleet()
+        jobs['job-5'] = job('job-5', url='git@example.com:repo-5.git',
+                            node='builder-1')
+        second, = templates_of(jobs)
+        assert first.id == second.id
+        assert first.id.startswith('template-')
+
+
+class TestExpandTemplates(object):
+    def test_round_trip(self):
+        jobs = fleet()
+        template, = templates_of(copy_data(jobs))
+        definitions = yaml.safe_load(dump_yaml(template.definitions()))
+        expanded = expand_templates(definitions)
+        assert [settings['name'] for settings in expanded] == sorted(jobs)
+        for settings in expanded:
+            assert settings == jobs[settings['name']]
+
+    def test_jjb(self, tmpdir):
+        template, = templates_of(fleet())
+        path = tmpdir.join('templates.yml')
+        path.write(dump_yaml(template.definitions()))
+        jjb = JenkinsJobs(['test', str(path), '-o', str(tmpdir.join('out'))])
+        assert jjb.execute() is None
+        xml = tmpdir.join('out', 'job-3').read()
+        assert '<description>Builds ${BRANCH} of {project}' in xml
+        assert 'git@example.com:repo-3.git' in xml
+
+
+def read(path):
+    with open(str(path)) as f:
+        return yaml.safe_load(f)
+
+
+class TestMacroWriterTemplates(object):
+    def run(self, tmpdir, jobs, min_count=None, templates=2):
+        with MacroWriter(OutputWriter(str(tmpdir)), min_count,
+                         templates) as writer:
+            for name, settings in sorted(jobs.items()):
+                writer.write(name, dump_yaml([{'job': settings}]))
+        return writer
+
+    def files(self, tmpdir):
+        return sorted(os.path.relpath(str(path), str(tmpdir))
+                      for path in tmpdir.visit(fil='*.yml'))
+
+    def test_templates(self, tmpdir):
+        jobs = fleet()
+        jobs['other'] = {'name': 'other', 'builders': [{'shell': 'true'}]}
+        self.run(tmpdir, jobs)
+        files = self.files(tmpdir)
+        assert len(files) == 2
+        assert files[0].startswith(TEMPLATES_DIR + os.sep)
+        assert files[1] == 'other.yml'
+        assert len(expand_templates(read(tmpdir.join(files[0])))) == 5
+
+    def test_rerun(self, tmpdir):
+        first = self.run(tmpdir, fleet())
+        files = self.files(tmpdir)
+        # The other jobs come from the template on disk.
+        writer = self.run(tmpdir, {'job-1': fleet()['job-1']})
+        assert writer.stats['written'] == 0
+        assert writer.stats['unchanged'] == 1
+        assert self.files(tmpdir) == files
+        # The size of the jobs without templates
+        assert writer.size == first.size
+
+    def test_without_templates(self, tmpdir):
+        self.run(tmpdir, fleet())
+        self.run(tmpdir, {'job-1': fleet()['job-1']}, templates=None)
+        assert self.files(tmpdir) == ['job-%d.yml' % i for i in range(5)]
+        assert not tmpdir.join(TEMPLATES_DIR).check()
+        assert read(tmpdir.join('job-3.yml')) == [{'job': fleet()['job-3']}]
+
+    def test_macros(self, tmpdir):
+        jobs = fleet()
+        jobs['other'] = job('other', shell='different')
+        jobs['other']['builders'].append({'shell': 'true'})
+        self.run(tmpdir, jobs, min_count=2)
+        macros = read(tmpdir.join('@macros.yml'))
+        # The template and "other" share their builders, not their SCMs,
+        # which hold a parameter in the template.
+        assert [next(iter(macro)) for macro in macros] == ['builder'] * 10
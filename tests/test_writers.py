@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.cli import ConversionContext, dump_yaml
+from jenkins_job_wrecker.writers import OutputWriter, StreamWriter
+import os
+import pytest
+import yaml
+
+
+class TestOutputWriter(object):
+    def test_write(self, tmpdir):
+        writer = OutputWriter(str(tmpdir))
+        filename = writer.write('folder/job', '- job: {}\n')
+        assert filename == str(tmpdir.join('folder', 'job.yml'))
+        assert tmpdir.join('folder', 'job.yml').read() == '- job: {}\n'
+        assert str(tmpdir.join('folder')) in writer.directories
+
+    def test_replace(self, tmpdir):
+        writer = OutputWriter(str(tmpdir))
+        writer.write('job', 'old\n')
+        writer.write('job', 'new\n')
+        assert tmpdir.join('job.yml').read() == 'new\n'
+        assert os.listdir(str(tmpdir)) == ['job.yml']
+
+    def test_interrupted(self, tmpdir):
+        writer = OutputWriter(str(tmpdir))
+        writer.write('job', 'old\n')
+        with pytest.raises(KeyboardInterrupt):
+            with writer.open('job') as f:
+                f.write('partial')
+                raise KeyboardInterrupt()
+        # Neither truncated nor left over
+        assert tmpdir.join('job.yml').read() == 'old\n'
+        assert os.listdir(str(tmpdir)) == ['job.yml']
+
+    def test_unchanged(self, tmpdir):
+        writer = OutputWriter(str(tmpdir))
+        writer.write('job', 'same\n')
+        os.utime(str(tmpdir.join('job.yml')), (0, 0))
+        writer.write('job', 'same\n')
+        writer.write('job', 'diff\n')
+        writer.write('other', 'same\n')
+        writer.write('job', 'diff\n')
+        assert writer.stats == {'written': 3, 'unchanged': 2, 'new': 2}
+        assert writer.summary() == '3 files written (2 new), 2 unchanged'
+        assert sorted(os.listdir(str(tmpdir))) == ['job.yml', 'other.yml']
+
+    def test_unchanged_keeps_mtime(self, tmpdir):
+        writer = OutputWriter(str(tmpdir))
+        writer.write('job', 'same\n')
+        os.utime(str(tmpdir.join('job.yml')), (0, 0))
+        writer.write('job', 'same\n')
+        assert os.path.getmtime(str(tmpdir.join('job.yml'))) == 0
+        # Same size, other contents
+        writer.write('job', 'sane\n')
+        assert os.path.getmtime(str(tmpdir.join('job.yml'))) != 0
+        assert tmpdir.join('job.yml').read() == 'sane\n'
+
+    def test_existing_directory(self, tmpdir):
+        tmpdir.mkdir('views')
+        writer = OutputWriter(str(tmpdir))
+        writer.write('views/view', 'view\n')
+        assert tmpdir.join('views', 'view.yml').read() == 'view\n'
+
+
+class TestStreamWriter(object):
+    def test_file(self, tmpdir):
+        path = str(tmpdir.join('out', 'all.yml'))
+        with StreamWriter(path) as writer:
+            writer.write('a', '- job:\n    name: a\n')
+            with writer.open('views/b') as f:
+                f.write('- view:\n    name: b\n')
+            assert writer.filename('a') == path
+            # Not there before the end of the run
+            assert not os.path.exists(path)
+        with open(path) as f:
+            assert yaml.safe_load(f) == [{'job': {'name': 'a'}},
+                                         {'view': {'name': 'b'}}]
+        assert os.listdir(str(tmpdir.join('out'))) == ['all.yml']
+
+    def test_interrupted(self, tmpdir):
+        tmpdir.join('all.yml').write('old\n')
+        with pytest.raises(KeyboardInterrupt):
+            with StreamWriter(str(tmpdir.join('all.yml'))) as writer:
+                writer.write('a', '- job:\n    name: a\n')
+                raise KeyboardInterrupt()
+        assert tmpdir.join('all.yml').read() == 'old\n'
+        assert os.listdir(str(tmpdir)) == ['all.yml']
+
+    def test_unchanged(self, tmpdir):
+        path = str(tmpdir.join('all.yml'))
+        tmpdir.join('all.yml').write('- job:\n    name: a\n')
+        os.utime(path, (0, 0))
+        with StreamWriter(path) as writer:
+            writer.write('a', '- job:\n    name: a\n')
+        assert os.path.getmtime(path) == 0
+        assert writer.stats == {'written': 0, 'unchanged': 1, 'new': 0}
+        assert os.listdir(str(tmpdir)) == ['all.yml']
+
+    def test_literal_block_at_the_end(self, tmpdir):
+        # A "|+" block at the end of a job makes the emitter end the
+        # document with "...".
+        context = ConversionContext()
+        path = str(tmpdir.join('all.yml'))
+        jobs = [[{'job': {'name': name, 'wrappers': [
+            {'shell': 'echo %s\n\n\n' % name}]}}] for name in 'ab']
+        with StreamWriter(path) as writer:
+            writer.write('a', dump_yaml(jobs[0], context=context))
+            with writer.open('b') as f:
+                dump_yaml(jobs[1], f, context=context)
+        with open(path) as f:
+            data = yaml.safe_load(f)
+        assert [job['job']['wrappers'][0]['shell'] for job in data] == \
+            ['echo a\n\n', 'echo b\n\n']
+
+    def test_stdout(self, capsys):
+        with StreamWriter('-') as writer:
+            writer.write('a', '- job:\n    name: a\n')
+            # Written as soon as each job is
+            assert capsys.readouterr().out == '- job:\n    name: a\n'
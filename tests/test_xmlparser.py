@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from jenkins_job_wrecker.cli import get_xml_root, root_to_yaml
+from jenkins_job_wrecker import xmlparser
+import os
+import pytest
+import xml.etree.ElementTree as ET
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+pytest.importorskip('lxml')
+
+
+@pytest.fixture
+def backend():
+    """ Restore the XML parser backend after the test. """
+    backend = xmlparser.get_backend()
+    yield xmlparser.set_backend
+    xmlparser.set_backend(backend)
+
+
+def convert_fixtures():
+    results = []
+    filenames = [os.path.join(dirpath, filename)
+                 for dirpath, _, names in os.walk(fixtures_path)
+                 for filename in names if filename.endswith('.xml')]
+    for filename in sorted(filenames):
+        root = get_xml_root(filename=filename)
+        name = os.path.basename(filename)
+        results.append(root_to_yaml(root, name))
+    return results
+
+
+class TestLxml(object):
+    def test_same_yaml(self, backend):
+        backend('etree')
+        expected = convert_fixtures()
+        backend('lxml')
+        assert convert_fixtures() == expected
+
+    def test_tostring(self, backend):
+        xml = b'<a><b x="1">\xc3\xa9<c/></b>\n  </a>'
+        backend('lxml')
+        b = get_xml_root(string=xml)[0]
+        assert xmlparser.tostring(b) == ET.tostring(ET.fromstring(xml)[0])
+
+    def test_text_with_declaration(self, backend):
+        backend('lxml')
+        root = get_xml_root(string=u"<?xml version='1.1' encoding='UTF-8'?>"
+                                    u"<a>é</a>")
+        assert root.text == u'é'
+
+    def test_no_comments(self, backend):
+        backend('lxml')
+        root = get_xml_root(string='<a><!-- b --><?c?><d/></a>')
+        assert [child.tag for child in root] == ['d']
+
+    def test_parse_error(self, backend):
+        backend('lxml')
+        with pytest.raises(ET.ParseError):
+            get_xml_root(string='<a><b></a>')
+
+    def test_recover(self, backend):
+        backend('lxml', recover=True)
+        root = get_xml_root(string='<a><b>text</a>')
+        assert root.findtext('b') == 'text'